@@ -0,0 +1,55 @@
+import json
+from typing import List
+import redis
+
+AUDIO_FEATURES_CACHE_KEY_PREFIX = "audio_features:"
+# Features used by the library analysis, stored by position to keep entries small
+AUDIO_FEATURE_NAMES = [
+    "acousticness", "danceability", "energy", "instrumentalness", "liveness",
+    "loudness", "speechiness", "tempo", "valence"
+]
+# Stored for tracks Spotify has no audio features for, so they aren't requested again
+NO_AUDIO_FEATURES = b""
+
+
+class RedisAudioFeaturesCache:
+    """
+    Audio features stored by track id in Redis, shared by all users and celery worker processes
+    Audio features of a track never change, so entries only expire to bound memory
+    """
+
+    def __init__(self, redis_url: str, ttl: int, socket_timeout: float = 1):
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                           socket_connect_timeout=socket_timeout)
+
+    @staticmethod
+    def encode(audio_features) -> bytes:
+        if audio_features is None:
+            return NO_AUDIO_FEATURES
+        return json.dumps([audio_features.get(feature_name) for feature_name in AUDIO_FEATURE_NAMES],
+                          separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def decode(track_id: str, value: bytes):
+        if value == NO_AUDIO_FEATURES:
+            return None
+        audio_features = dict(zip(AUDIO_FEATURE_NAMES, json.loads(value)))
+        audio_features["id"] = track_id
+        return audio_features
+
+    def get_many(self, track_ids: List[str]) -> dict:
+        """
+        Return dict of track id to audio features (None if the track has none) for cached tracks
+        """
+        values = self._redis.mget([AUDIO_FEATURES_CACHE_KEY_PREFIX + track_id for track_id in track_ids])
+        return {
+            track_id: self.decode(track_id, value)
+            for track_id, value in zip(track_ids, values) if value is not None
+        }
+
+    def set_many(self, audio_features_by_id: dict):
+        pipeline = self._redis.pipeline(transaction=False)
+        for track_id, audio_features in audio_features_by_id.items():
+            pipeline.set(AUDIO_FEATURES_CACHE_KEY_PREFIX + track_id, self.encode(audio_features), ex=self.ttl)
+        pipeline.execute()
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import redis
+
+RESPONSE_CACHE_KEY_PREFIX = "spotify_response:"
+ETAG_FIELD = "etag"
+HEADERS_FIELD = "headers"
+CONTENT_FIELD = "content"
+
+
+class RedisResponseCache:
+    """
+    ETag'd HTTP responses stored in Redis so they can be shared by all gunicorn and celery worker processes
+    Entries are only served after Spotify confirms them with a 304, so they never go stale
+    """
+
+    def __init__(self, redis_url: str, ttl: int, socket_timeout: float = 1):
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                           socket_connect_timeout=socket_timeout)
+
+    @staticmethod
+    def get_key(cache_key: str) -> str:
+        return RESPONSE_CACHE_KEY_PREFIX + hashlib.sha256(cache_key.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key: str):
+        """
+        Return dict with etag, headers and content for cache_key, or None if not cached
+        """
+        entry = self._redis.hgetall(self.get_key(cache_key))
+        if not entry or ETAG_FIELD.encode() not in entry or CONTENT_FIELD.encode() not in entry:
+            return None
+        return {
+            ETAG_FIELD: entry[ETAG_FIELD.encode()].decode('utf-8'),
+            HEADERS_FIELD: json.loads(entry.get(HEADERS_FIELD.encode(), b"{}")),
+            CONTENT_FIELD: entry[CONTENT_FIELD.encode()]
+        }
+
+    def set(self, cache_key: str, etag: str, headers: dict, content: bytes, ttl: int = None):
+        """
+        Store etag, headers and content for cache_key, kept for ttl seconds or the cache's ttl if not given
+        """
+        key = self.get_key(cache_key)
+        pipeline = self._redis.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, mapping={
+            ETAG_FIELD: etag,
+            HEADERS_FIELD: json.dumps(headers),
+            CONTENT_FIELD: content
+        })
+        pipeline.expire(key, self.ttl if ttl is None else ttl)
+        pipeline.execute()
@@ -0,0 +1,51 @@
+import zlib
+from typing import List
+import redis
+
+TRACK_URI_CACHE_KEY_PREFIX = "track_uris:"
+TRACK_URI_PREFIX = "spotify:track:"
+SHORT_TRACK_URI_PREFIX = ":"
+
+
+class RedisTrackUriCache:
+    """
+    Lists of track uris stored compactly in Redis, shared by all celery worker processes
+    Keys include a version of the tracks (e.g. playlist snapshot id) so entries are never stale, only expired
+    """
+
+    def __init__(self, redis_url: str, ttl: int, socket_timeout: float = 1):
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=socket_timeout,
+                                           socket_connect_timeout=socket_timeout)
+
+    @staticmethod
+    def encode(track_uris: List[str]) -> bytes:
+        """
+        Drop the common spotify:track: prefix, keeping a short marker, then compress
+        Other uris (e.g. local files) are stored in full
+        """
+        return zlib.compress("\n".join(
+            SHORT_TRACK_URI_PREFIX + track_uri[len(TRACK_URI_PREFIX):] if track_uri.startswith(TRACK_URI_PREFIX)
+            else track_uri
+            for track_uri in track_uris
+        ).encode('utf-8'))
+
+    @staticmethod
+    def decode(value: bytes) -> List[str]:
+        decoded = zlib.decompress(value).decode('utf-8')
+        if decoded == "":
+            return []
+        return [
+            TRACK_URI_PREFIX + track_uri[len(SHORT_TRACK_URI_PREFIX):] if track_uri.startswith(SHORT_TRACK_URI_PREFIX)
+            else track_uri
+            for track_uri in decoded.split("\n")
+        ]
+
+    def get(self, key: str):
+        value = self._redis.get(TRACK_URI_CACHE_KEY_PREFIX + key)
+        if value is None:
+            return None
+        return self.decode(value)
+
+    def set(self, key: str, track_uris: List[str]):
+        self._redis.set(TRACK_URI_CACHE_KEY_PREFIX + key, self.encode(track_uris), ex=self.ttl)
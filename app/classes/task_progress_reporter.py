@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class TaskProgressReporter:
+    """
+    Rate limited task progress updates, so long loops don't write to the result backend on every step
+    Progress is sent once min_interval_seconds have passed since the last progress sent and, when done and total
+    are given, once it has moved by at least min_percent_delta percent
+    The first and final (done == total) progress are always sent, flush sends the latest progress held back
+    """
+
+    def __init__(self, send_progress, min_interval_seconds: float = 1, min_percent_delta: float = 1):
+        self.min_interval_seconds = min_interval_seconds
+        self.min_percent_delta = min_percent_delta
+        self._send_progress = send_progress
+        self._last_sent_time = None
+        self._last_sent_percent = None
+        self._pending_progress = None
+        self._lock = threading.Lock()
+
+    def update(self, state: str, done: int = None, total: int = None, **progress_fields):
+        """
+        Report progress with a state message and optionally numeric done/total and other progress fields
+        Return True if the progress was sent
+        """
+        progress = {"state": state}
+        percent = None
+        if done is not None and total is not None:
+            percent = 100.0 if total <= 0 else min(100.0, 100.0 * done / total)
+            progress["done"] = done
+            progress["total"] = total
+            progress["percent"] = round(percent, 1)
+        progress.update(progress_fields)
+
+        with self._lock:
+            now = time.monotonic()
+            if not self._should_send(now, percent):
+                self._pending_progress = progress
+                return False
+            self._last_sent_time = now
+            self._last_sent_percent = percent
+            self._pending_progress = None
+        self._send_progress(progress)
+        return True
+
+    def flush(self):
+        """
+        Send the latest progress if it was held back
+        """
+        with self._lock:
+            progress = self._pending_progress
+            if progress is None:
+                return False
+            self._last_sent_time = time.monotonic()
+            self._last_sent_percent = progress.get("percent")
+            self._pending_progress = None
+        self._send_progress(progress)
+        return True
+
+    def _should_send(self, now: float, percent: float) -> bool:
+        if self._last_sent_time is None or percent == 100.0:
+            return True
+        if now - self._last_sent_time < self.min_interval_seconds:
+            return False
+        return percent is None or self._last_sent_percent is None \
+            or percent - self._last_sent_percent >= self.min_percent_delta
@@ -39,11 +39,13 @@ def get_playlists(spotify_auth):
 def queue_shuffle_playlist(spotify_auth, request_body):
     """
     Endpoint to queue the creation of a shuffled playlist
+    Set is_make_new_playlist to false to reuse an existing shuffled playlist
     Validates Spotify authentication and request body schema
     """
     try:
         response = make_response(playlist_service.queue_create_shuffled_playlist(
-            spotify_auth, request_body["playlist_id"], request_body["playlist_name"]))
+            spotify_auth, request_body["playlist_id"], request_body["playlist_name"],
+            request_body.get("is_make_new_playlist", True)))
         extend_session_expiry(response, request.cookies)
         return response
     except Exception as e:
@@ -70,11 +72,11 @@ def get_shuffle_state(id, spotify_auth):
 @spotify_auth_validator
 def delete_shuffled_playlists(spotify_auth):
     """
-    Endpoint to delete all shuffled playlists for the authenticated user
+    Endpoint to queue the deletion of all shuffled playlists for the authenticated user
     Validates Spotify authentication
     """
     try:
-        response = make_response(playlist_service.delete_all_shuffled_playlists(spotify_auth))
+        response = make_response(playlist_service.queue_delete_all_shuffled_playlists(spotify_auth))
         extend_session_expiry(response, request.cookies)
         return response
     except Exception as e:
@@ -82,6 +84,21 @@ def delete_shuffled_playlists(spotify_auth):
         return {"error": "Unable to delete shuffled playlists"}, 400
 
 
+@playlist_controller.route('/delete/state/<id>', methods=['GET'])
+@spotify_auth_validator
+def get_delete_shuffled_playlists_state(id, spotify_auth):
+    """
+    Endpoint to get the state of a shuffled playlists deletion process
+    Validates Spotify authentication
+    """
+    try:
+        response = make_response(playlist_service.get_delete_all_shuffled_playlists_state(id))
+        return response
+    except Exception as e:
+        current_app.logger.error("Unable to retrieve delete shuffled playlists state: " + str(e))
+        return {"error": "Unable to retrieve delete shuffled playlists state"}, 400
+
+
 @playlist_controller.route('/share/liked-tracks', methods=['POST'])
 @spotify_auth_validator
 @request_schema_validator(ShareLikedTracksRequestSchema)
@@ -22,3 +22,19 @@ def update_trackers():
 
     current_app.logger.debug("Valid credentials")
     return (trackers_service.update_trackers(current_app))
+
+
+@trackers_controller.route('/update/state/<id>', methods=['GET'])
+def get_update_trackers_state(id):
+    # Verify jwt
+    try:
+        auth_header = request.headers.get('Authorization')
+        validate_auth_header_jwt(auth_header)
+    except AccessTokenInvalid as e:
+        current_app.logger.error("Error decoding token: " + str(e))
+        return {"error": "Invalid credentials"}, 403
+    except Exception as e:
+        current_app.logger.error("Error decoding token: " + str(e))
+        return {"error": "Invalid credentials"}, 403
+
+    return trackers_service.get_update_trackers_state(id)
@@ -2,9 +2,11 @@ from flask_pymongo import PyMongo
 from flask import current_app
 from main import mongo
 import pymongo
+from pymongo import UpdateOne
 from pymongo.collection import ReturnDocument
 from bson.objectid import ObjectId
-from utils.constants import USER_ID_KEY
+from utils.constants import USER_ID_KEY, SHUFFLED_PLAYLIST_SOURCE_ID_KEY, SHUFFLED_PLAYLIST_ID_KEY, \
+    LAST_UPDATED_KEY, RECENT_SHUFFLES_KEY
 
 
 # Liked tracks history functions
@@ -12,6 +14,10 @@ def insert_liked_tracks_history_entry(tracker_entry):
     return mongo.db.liked_tracks_history.insert_one(tracker_entry)
 
 
+def insert_liked_tracks_history_entries(tracker_entries):
+    return mongo.db.liked_tracks_history.insert_many(tracker_entries, ordered=False)
+
+
 def find_user_latest_liked_tracks_history_entry(user_id):
     return mongo.db.liked_tracks_history.find_one(
         {USER_ID_KEY: user_id},
@@ -19,6 +25,20 @@ def find_user_latest_liked_tracks_history_entry(user_id):
     )
 
 
+def find_users_latest_liked_tracks_counts(user_ids):
+    """
+    Get the count from each user's latest liked tracks history entry in one aggregation
+    Returns dict of user id to count, users without an entry are not included
+    """
+    latest_entries = mongo.db.liked_tracks_history.aggregate([
+        {"$match": {USER_ID_KEY: {"$in": user_ids}}},
+        # Same direction on both keys so the sort walks the user_id/_id index backwards
+        {"$sort": {USER_ID_KEY: pymongo.DESCENDING, "_id": pymongo.DESCENDING}},
+        {"$group": {"_id": "$" + USER_ID_KEY, "count": {"$first": "$count"}}}
+    ])
+    return {latest_entry["_id"]: latest_entry["count"] for latest_entry in latest_entries}
+
+
 def get_all_user_liked_tracks_history_data(user_id):
     return mongo.db.liked_tracks_history.find(
         {USER_ID_KEY: user_id},
@@ -61,6 +81,28 @@ def find_and_update_shuffle_counter(user_id, shuffle_history_counter):
     )
 
 
+def increment_shuffle_counter(user_id, counter_increments):
+    return mongo.db.shuffle_history.update_one(
+        {USER_ID_KEY: user_id},
+        {"$inc": counter_increments}
+    )
+
+
+def increment_user_shuffle_counter(user_id, counter_increments, last_updated, recent_shuffles_entry, max_recent_shuffles):
+    """
+    Increment counters and append to recent shuffles in one atomic update, creating the entry if needed
+    """
+    return mongo.db.shuffle_history.update_one(
+        {USER_ID_KEY: user_id},
+        {
+            "$inc": counter_increments,
+            "$set": {LAST_UPDATED_KEY: last_updated},
+            "$push": {RECENT_SHUFFLES_KEY: {"$each": [recent_shuffles_entry], "$slice": -max_recent_shuffles}}
+        },
+        upsert=True
+    )
+
+
 # User functions
 
 
@@ -79,10 +121,78 @@ def find_user(user_id):
     )
 
 
+def update_user_spotify_token(user_id, token_entry):
+    return mongo.db.users.update_one(
+        {USER_ID_KEY: user_id},
+        {"$set": {"spotify." + key: value for key, value in token_entry.items()}}
+    )
+
+
+def update_users_liked_tracks_etags(liked_tracks_etags):
+    """
+    Save each user's liked tracks ETag in one unordered bulk write
+    """
+    return mongo.db.users.bulk_write([
+        UpdateOne({USER_ID_KEY: user_id}, {"$set": {"liked_tracks_etag": liked_tracks_etag}})
+        for user_id, liked_tracks_etag in liked_tracks_etags.items()
+    ], ordered=False)
+
+
 def get_all_users_with_attribute(attribute_name, attribute_value):
     return mongo.db.users.find({"user_attributes." + attribute_name: attribute_value})
 
 
+# Shuffled playlist functions
+# Schema
+# {
+#    USER_ID_KEY: user_id,
+#    SHUFFLED_PLAYLIST_SOURCE_ID_KEY: playlist_id,
+#    SHUFFLED_PLAYLIST_ID_KEY: shuffled_playlist_id,
+#    SHUFFLED_PLAYLIST_URI_KEY: shuffled_playlist_uri,
+#    LAST_UPDATED_KEY: last_updated
+# }
+
+
+def find_shuffled_playlist(user_id, playlist_id):
+    return mongo.db.shuffled_playlists.find_one(
+        {USER_ID_KEY: user_id, SHUFFLED_PLAYLIST_SOURCE_ID_KEY: playlist_id}
+    )
+
+
+def find_and_update_shuffled_playlist(user_id, playlist_id, shuffled_playlist_entry):
+    return mongo.db.shuffled_playlists.find_one_and_update(
+        {USER_ID_KEY: user_id, SHUFFLED_PLAYLIST_SOURCE_ID_KEY: playlist_id},
+        {"$set": shuffled_playlist_entry},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def delete_user_shuffled_playlists(user_id, shuffled_playlist_ids):
+    return mongo.db.shuffled_playlists.delete_many(
+        {USER_ID_KEY: user_id, SHUFFLED_PLAYLIST_ID_KEY: {"$in": shuffled_playlist_ids}}
+    )
+
+
+# Library analysis functions
+# Stores each user's Liked Songs analysis aggregates so later analyses only process newly liked tracks
+
+
+def find_library_analysis(user_id):
+    return mongo.db.library_analysis.find_one(
+        {USER_ID_KEY: user_id}
+    )
+
+
+def find_and_update_library_analysis(user_id, library_analysis_entry):
+    return mongo.db.library_analysis.find_one_and_update(
+        {USER_ID_KEY: user_id},
+        {"$set": library_analysis_entry},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
 # Session functions
 
 def find_session(session_id):
@@ -106,7 +216,18 @@ def delete_session(session_id):
     )
 
 
-def delete_expired_session(current_datetime):
+def find_expired_session_ids(current_datetime, batch_size):
+    return [
+        session_entry["_id"] for session_entry in mongo.db.sessions.find(
+            {"session_expiry": {"$lt": current_datetime}},
+            {"_id": 1},
+            limit=batch_size
+        )
+    ]
+
+
+def delete_sessions_by_ids(session_entry_ids):
     return mongo.db.sessions.delete_many(
-        {"session_expiry": {"$lt": current_datetime}},
+        {"_id": {"$in": session_entry_ids}},
     )
+
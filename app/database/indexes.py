@@ -0,0 +1,230 @@
+import argparse
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+import pymongo
+from pymongo import IndexModel
+from utils.constants import USER_ID_KEY, SHUFFLED_PLAYLIST_SOURCE_ID_KEY, SESSION_DB_SESSION_EXPIRY_KEY
+
+TRACKERS_ENABLED_ATTRIBUTE_NAME = "trackers_enabled"
+COLLECTION_SCAN_STAGE = "COLLSCAN"
+
+# Index definitions for each collection, applied on app and worker startup
+# create_index is a no-op when an index with the same name and definition already exists
+INDEXES = {
+    "users": [
+        IndexModel([(USER_ID_KEY, pymongo.ASCENDING)], unique=True, name="user_id_unique"),
+        IndexModel([("user_attributes." + TRACKERS_ENABLED_ATTRIBUTE_NAME, pymongo.ASCENDING)],
+                   name="user_attributes_trackers_enabled"),
+    ],
+    "liked_tracks_history": [
+        IndexModel([(USER_ID_KEY, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)], name="user_id_id"),
+    ],
+    "shuffle_history": [
+        IndexModel([(USER_ID_KEY, pymongo.ASCENDING), ("_id", pymongo.ASCENDING)], name="user_id_id"),
+    ],
+    "shuffled_playlists": [
+        IndexModel([(USER_ID_KEY, pymongo.ASCENDING), (SHUFFLED_PLAYLIST_SOURCE_ID_KEY, pymongo.ASCENDING)],
+                   unique=True, name="user_id_playlist_id_unique"),
+    ],
+    "library_analysis": [
+        IndexModel([(USER_ID_KEY, pymongo.ASCENDING)], unique=True, name="user_id_unique"),
+    ],
+    "sessions": [
+        IndexModel([("session_id", pymongo.ASCENDING)], unique=True, name="session_id_unique"),
+        # TTL index lets MongoDB remove sessions once session_expiry has passed
+        IndexModel([(SESSION_DB_SESSION_EXPIRY_KEY, pymongo.ASCENDING)], expireAfterSeconds=0,
+                   name="session_expiry_ttl"),
+    ],
+}
+
+# Sample arguments for every query function in database.py
+# Each function is called with these against a RecordingDatabase to capture the filter and sort it queries with
+# Updates, deletes and aggregation matches are explained as a find with the same filter and sort
+QUERY_ARGUMENTS = {
+    "insert_liked_tracks_history_entry": ({},),
+    "insert_liked_tracks_history_entries": ([{}],),
+    "find_user_latest_liked_tracks_history_entry": ("",),
+    "find_users_latest_liked_tracks_counts": ([""],),
+    "get_all_user_liked_tracks_history_data": ("",),
+    "get_all_user_shuffle_history_data": ("",),
+    "find_shuffle_counter": ("",),
+    "find_and_update_shuffle_counter": ("", {}),
+    "increment_shuffle_counter": ("", {}),
+    "increment_user_shuffle_counter": ("", {}, None, {}, 1),
+    "find_and_update_user": ("", {}),
+    "find_user": ("",),
+    "update_user_spotify_token": ("", {}),
+    "update_users_liked_tracks_etags": ({"": ""},),
+    "get_all_users_with_attribute": (TRACKERS_ENABLED_ATTRIBUTE_NAME, True),
+    "find_shuffled_playlist": ("", ""),
+    "find_and_update_shuffled_playlist": ("", "", {}),
+    "delete_user_shuffled_playlists": ("", [""]),
+    "find_library_analysis": ("",),
+    "find_and_update_library_analysis": ("", {}),
+    "find_session": ("",),
+    "find_and_update_session": ("", {}),
+    "delete_session": ("",),
+    "find_expired_session_ids": (datetime(1970, 1, 1), 1),
+    "delete_sessions_by_ids": ([""],),
+}
+
+
+class RecordingCollection:
+    """
+    Stands in for a collection, recording the filter and sort of each query instead of running it
+    Inserts have no filter so aren't recorded
+    """
+
+    def __init__(self, name: str, queries: list):
+        self.name = name
+        self.queries = queries
+
+    def record(self, query_filter: dict, sort=None):
+        self.queries.append((self.name, query_filter, list(sort) if sort else None))
+
+    def find(self, filter=None, projection=None, sort=None, **kwargs):
+        self.record(filter or {}, sort)
+        return []
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        self.record(filter or {}, sort)
+        return None
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, **kwargs):
+        self.record(filter, sort)
+        return None
+
+    def update_one(self, filter, update, **kwargs):
+        self.record(filter)
+
+    def delete_one(self, filter, **kwargs):
+        self.record(filter)
+
+    update_many = update_one
+    delete_many = delete_one
+
+    def bulk_write(self, requests, **kwargs):
+        for request in requests:
+            self.record(request._filter)
+
+    def aggregate(self, pipeline, **kwargs):
+        # Only the leading $match and $sort stages can use an index
+        match_stage = next((stage["$match"] for stage in pipeline if "$match" in stage), {})
+        sort_stage = next((stage["$sort"] for stage in pipeline if "$sort" in stage), None)
+        self.record(match_stage, sort_stage.items() if sort_stage else None)
+        return []
+
+    def insert_one(self, document, **kwargs):
+        return None
+
+    def insert_many(self, documents, **kwargs):
+        return None
+
+
+class RecordingDatabase:
+    """
+    Stands in for mongo.db, every collection records its queries into queries
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __getattr__(self, collection_name: str) -> RecordingCollection:
+        return RecordingCollection(collection_name, self.queries)
+
+
+def get_queries() -> list:
+    """
+    Call each query function in database.py with its QUERY_ARGUMENTS against a RecordingDatabase
+    Returns (name, collection, filter, sort) for each query they make
+    """
+    from database import database
+
+    queries = []
+    database_mongo = database.mongo
+    try:
+        for name, arguments in QUERY_ARGUMENTS.items():
+            recording_db = RecordingDatabase()
+            database.mongo = SimpleNamespace(db=recording_db)
+            getattr(database, name)(*arguments)
+            queries.extend((name,) + query for query in recording_db.queries)
+    finally:
+        database.mongo = database_mongo
+    return queries
+
+
+def ensure_indexes(db, logger):
+    """
+    Create all indexes in INDEXES if they don't exist
+    Each collection is applied separately so one failure doesn't stop the rest
+    Returns the names of collections that failed
+    """
+    failed_collections = []
+    for collection_name, index_models in INDEXES.items():
+        try:
+            db[collection_name].create_indexes(index_models)
+        except Exception as e:
+            logger.error("Unable to create indexes for " + collection_name + ": " + str(e))
+            failed_collections.append(collection_name)
+    return failed_collections
+
+
+def get_plan_stages(plan) -> list:
+    """
+    Get every stage name in a query plan, including nested input stages
+    """
+    stages = []
+    plans = [plan]
+    while plans:
+        current_plan = plans.pop()
+        if "stage" in current_plan:
+            stages.append(current_plan["stage"])
+        if "inputStage" in current_plan:
+            plans.append(current_plan["inputStage"])
+        plans.extend(current_plan.get("inputStages", []))
+        # Plans from the slot based engine are nested under queryPlan
+        if "queryPlan" in current_plan:
+            plans.append(current_plan["queryPlan"])
+    return stages
+
+
+def find_collection_scans(db) -> list:
+    """
+    Explain each query made by database.py and return the names of those whose winning plan scans the collection
+    """
+    collection_scans = []
+    for name, collection_name, query_filter, sort in get_queries():
+        explanation = db[collection_name].find(query_filter, sort=sort).explain()
+        winning_plan = explanation["queryPlanner"]["winningPlan"]
+        if COLLECTION_SCAN_STAGE in get_plan_stages(winning_plan):
+            collection_scans.append(name)
+    return collection_scans
+
+
+def main(argv=None):
+    """
+    Apply indexes and/or verify query plans against the configured database
+    e.g. python -m database.indexes --verify
+    """
+    parser = argparse.ArgumentParser(description="Manage database indexes")
+    parser.add_argument("--ensure", action="store_true", help="create any missing indexes")
+    parser.add_argument("--verify", action="store_true", help="fail if any query scans a collection")
+    args = parser.parse_args(argv)
+
+    from main import app, mongo
+
+    with app.app_context():
+        if args.ensure and ensure_indexes(mongo.db, app.logger):
+            return 1
+        if args.verify:
+            collection_scans = find_collection_scans(mongo.db)
+            if collection_scans:
+                app.logger.error("Queries using collection scans: " + ", ".join(collection_scans))
+                return 1
+            app.logger.info("All queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
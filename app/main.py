@@ -37,6 +37,8 @@ def create_app():
         """We don't provide a URI when running unit tests, so PyMongo will fail to initialize.
         This is okay because we replace it with a version for testing anyway. """
         app.logger.info('PyMongo not initialized!')
+    if app.config["MONGO_ENSURE_INDEXES"]:
+        ensure_database_indexes(app)
 
     app.config.from_mapping(
         CELERY=dict(
@@ -51,6 +53,18 @@ def create_app():
     return app
 
 
+def ensure_database_indexes(app):
+    from database import indexes
+
+    if mongo.db is None:
+        return
+    try:
+        with app.app_context():
+            indexes.ensure_indexes(mongo.db, app.logger)
+    except Exception as e:
+        app.logger.error("Unable to ensure database indexes: " + str(e))
+
+
 def register_all_blueprints(app):
     from controllers.spotify_auth_controller import spotify_auth_controller
     from controllers.playlist_controller import playlist_controller
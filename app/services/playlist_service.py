@@ -1,4 +1,3 @@
-import spotipy
 from bson import json_util
 import json
 from flask import current_app
@@ -6,9 +5,10 @@ from tasks.task_state import get_celery_task_state
 from database import database
 from exceptions.custom_exceptions import SpotifyAuthInvalid
 from classes.spotify_auth import SpotifyAuth
-from services.spotify_client import create_auth_manager_with_token
+from services.spotify_client import create_auth_manager_with_token, create_spotify_client_with_auth_manager
 from schemas.Playlist import Playlist
 from tasks import playlist_tasks
+from utils import util
 
 SHUFFLED_PLAYLIST_PREFIX = "[Shuffled] "
 LIKED_TRACKS_PLAYLIST_ID = "likedTracks"
@@ -18,10 +18,10 @@ TRACK_SHUFFLES_ATTRIBUTE_NAME = "track_shuffles"
 def get_user_playlists(spotify_auth: SpotifyAuth, include_stats):
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         raise SpotifyAuthInvalid("Invalid token")
-    user = spotify.me()
+    user = util.get_user_profile(spotify, spotify_auth.access_token)
     if user is None:
         raise Exception("User not found in Spotify")
 
@@ -41,7 +41,7 @@ def get_user_playlists(spotify_auth: SpotifyAuth, include_stats):
 
     get_playlists_success_log = "User: {user_id} -- Retrieved {num_of_playlists:d} playlists"
     current_app.logger.info(get_playlists_success_log.format(
-        user_id=spotify.me()["id"], num_of_playlists=len(all_playlists)))
+        user_id=user["id"], num_of_playlists=len(all_playlists)))
 
     response_body = dict()
     response_body["all_playlists"] = all_playlists
@@ -68,8 +68,9 @@ def get_user_playlists(spotify_auth: SpotifyAuth, include_stats):
     return response_body
 
 
-def queue_create_shuffled_playlist(spotify_auth: SpotifyAuth, playlist_id, playlist_name):
-    result = playlist_tasks.shuffle_playlist.delay(spotify_auth.to_dict(), playlist_id, playlist_name)
+def queue_create_shuffled_playlist(spotify_auth: SpotifyAuth, playlist_id, playlist_name, make_new_playlist=True):
+    result = playlist_tasks.shuffle_playlist.delay(
+        spotify_auth.to_dict(), playlist_id, playlist_name, make_new_playlist)
     current_app.logger.info("Shuffle id:" + result.id)
     return {"shuffle_task_id": result.id}
 
@@ -78,28 +79,19 @@ def get_shuffle_state(id: str):
     return get_celery_task_state(id, "Shuffle playlist")
 
 
-def delete_all_shuffled_playlists(spotify_auth: SpotifyAuth):
+def queue_delete_all_shuffled_playlists(spotify_auth: SpotifyAuth):
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         raise SpotifyAuthInvalid("Invalid token")
 
-    # Search all user playlists for shuffled playlists
-    user_playlists = spotify.current_user_playlists()
-    deleted_playlists = []
-    for playlist in user_playlists["items"]:
-        if str(playlist["name"]).startswith(SHUFFLED_PLAYLIST_PREFIX):
-            spotify.current_user_unfollow_playlist(playlist["id"])
-            deleted_playlists.append(playlist["id"])
-
-    delete_success_log = "User: {user_id} -- Deleted {num_deleted_playlists:d} playlist(s): {deleted_playlists_list}"
-    current_app.logger.info(delete_success_log.format(user_id=spotify.me()["id"], num_deleted_playlists=len(
-        deleted_playlists), deleted_playlists_list=str(deleted_playlists)))
-    return {
-        "status": "success",
-        "deleted_playlists_count": len(deleted_playlists)
-    }
+    result = playlist_tasks.delete_all_shuffled_playlists.delay(spotify_auth.to_dict())
+    current_app.logger.info("Delete shuffled playlists id:" + result.id)
+    return {"delete_task_id": result.id}
+
+
+def get_delete_all_shuffled_playlists_state(id: str):
+    return get_celery_task_state(id, "Delete shuffled playlists")
 
 
 def queue_create_playlist_from_liked_tracks(spotify_auth: SpotifyAuth, new_playlist_name="My Liked Tracks"):
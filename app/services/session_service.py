@@ -3,11 +3,36 @@ from database import database
 
 
 def handle_clean_up_expired_sesions(current_app):
-    delete_response = database.delete_expired_session(
-        datetime.now(timezone.utc))
+    """
+    Delete expired sessions in batches of SESSION_CLEANUP_BATCH_SIZE
+    Expired sessions are normally removed by the session_expiry TTL index, this is a fallback
+    Stops after SESSION_CLEANUP_MAX_BATCHES so each call is bounded, remaining sessions are removed on the next call
+    """
+    current_datetime = datetime.now(timezone.utc)
+    batch_size = current_app.config["SESSION_CLEANUP_BATCH_SIZE"]
+    deleted_count = 0
+    batches = 0
+    complete = False
+    while batches < current_app.config["SESSION_CLEANUP_MAX_BATCHES"]:
+        expired_session_ids = database.find_expired_session_ids(current_datetime, batch_size)
+        if len(expired_session_ids) == 0:
+            complete = True
+            break
+        delete_response = database.delete_sessions_by_ids(expired_session_ids)
+        deleted_count += delete_response.deleted_count
+        batches += 1
+        current_app.logger.info(
+            "Cleanup batch {batch:d} deleted {batch_deleted:d} expired sessions, {deleted:d} so far".format(
+                batch=batches, batch_deleted=delete_response.deleted_count, deleted=deleted_count))
+        if len(expired_session_ids) < batch_size:
+            complete = True
+            break
+
     current_app.logger.info(
-        "Cleanup successfully completed. Deleted expired sessions: " + str(delete_response.deleted_count))
+        "Cleanup successfully completed. Deleted expired sessions: " + str(deleted_count))
     return {
         "status": "success",
-        "deleted_count": str(delete_response.deleted_count)
+        "deleted_count": str(deleted_count),
+        "batches": batches,
+        "complete": complete
     }
@@ -1,14 +1,161 @@
+import logging
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import requests
+import urllib3
+from requests.structures import CaseInsensitiveDict
 from spotipy.oauth2 import SpotifyOAuth
 from spotipy.cache_handler import MemoryCacheHandler
 from spotipy import Spotify
 from dotenv import load_dotenv
 from classes.spotify_auth import SpotifyAuth
+from classes.redis_response_cache import RedisResponseCache, ETAG_FIELD, HEADERS_FIELD, CONTENT_FIELD
 
 load_dotenv()
 
+# Spotify api path of endpoints for the current user
+CURRENT_USER_PATH = "/v1/me"
+# Spotify api path of the current user's Liked Songs, which analysis already retrieves incrementally
+LIKED_TRACKS_PATH = CURRENT_USER_PATH + "/tracks"
+
+# Module logger, the shared session is also used from worker threads without an app context
+logger = logging.getLogger(__name__)
+
+_shared_session = None
+_shared_session_pid = None
+_shared_session_lock = threading.Lock()
+
+
+class SharedSession(requests.Session):
+    """
+    Requests session shared by all Spotify clients in a process
+    Spotify clients close their session when garbage collected, so close is ignored to keep the pool open
+    If a response cache is set, GET responses with an ETag are cached and revalidated with If-None-Match
+    Current user (/me) responses are kept for current_user_response_cache_ttl seconds, 0 to not cache them
+    """
+
+    response_cache = None
+    current_user_response_cache_ttl = None
+
+    def request(self, method, url, *args, **kwargs):
+        if self.response_cache is None or str(method).upper() != "GET":
+            return super().request(method, url, *args, **kwargs)
+        headers = dict(kwargs.pop("headers", None) or {})
+        # Callers making their own conditional request handle the 304 themselves
+        if "If-None-Match" in headers:
+            return super().request(method, url, *args, headers=headers, **kwargs)
+        prepared_url = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        path = urllib3.util.parse_url(prepared_url).path or ""
+        is_current_user_path = path.startswith(CURRENT_USER_PATH)
+        # Liked Songs pages are not cached, analysis only retrieves pages newer than its stored analysis
+        if path.startswith(LIKED_TRACKS_PATH) or (is_current_user_path and self.current_user_response_cache_ttl == 0):
+            return super().request(method, url, *args, headers=headers, **kwargs)
+
+        # An entry is only served once Spotify confirms it is current for this user's token
+        cache_key = get_response_cache_key(prepared_url, headers)
+        cached_entry = self.get_cached_response(cache_key)
+        if cached_entry is not None:
+            headers["If-None-Match"] = cached_entry[ETAG_FIELD]
+        response = super().request(method, url, *args, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached_entry is not None:
+            return build_cached_response(response, cached_entry)
+        if response.status_code == 200 and response.headers.get("ETag") is not None:
+            self.set_cached_response(
+                cache_key, response, self.current_user_response_cache_ttl if is_current_user_path else None)
+        return response
+
+    def get_cached_response(self, cache_key: str):
+        try:
+            return self.response_cache.get(cache_key)
+        except Exception as e:
+            logger.error("Error reading Spotify response cache: " + str(e))
+            return None
+
+    def set_cached_response(self, cache_key: str, response: requests.Response, ttl: int = None):
+        try:
+            self.response_cache.set(cache_key, response.headers["ETag"],
+                                    {"Content-Type": response.headers.get("Content-Type", "application/json")},
+                                    response.content, ttl)
+        except Exception as e:
+            logger.error("Error writing Spotify response cache: " + str(e))
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+def get_response_cache_key(url: str, headers: dict) -> str:
+    """
+    Key responses by url, and by the caller's token for current user (/me) endpoints
+    Current user urls are the same for every user, so sharing their entries would have users overwrite each other
+    Tokens are refreshed hourly, so these entries are kept for a shorter ttl than shared entries
+    """
+    if urllib3.util.parse_url(url).path.startswith(CURRENT_USER_PATH):
+        return url + " " + str(headers.get("Authorization", ""))
+    return url
+
+
+def build_cached_response(not_modified_response: requests.Response, cached_entry: dict) -> requests.Response:
+    """
+    Build a 200 response from a cached entry to return in place of a 304
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict(cached_entry[HEADERS_FIELD])
+    response.headers["ETag"] = cached_entry[ETAG_FIELD]
+    response._content = cached_entry[CONTENT_FIELD]
+    response.encoding = "utf-8"
+    response.url = not_modified_response.url
+    response.request = not_modified_response.request
+    response.reason = "OK"
+    return response
+
+
+def get_shared_session(current_app) -> requests.Session:
+    """
+    Get the process wide pooled session used for all calls to Spotify
+    A new session is created after a fork so gunicorn and celery worker processes never share sockets
+    Only the connection pool is shared, tokens are passed per request by each user's auth manager
+    """
+    global _shared_session, _shared_session_pid
+    with _shared_session_lock:
+        if _shared_session is None or _shared_session_pid != os.getpid():
+            session = SharedSession()
+            # Don't keep cookies set by one user's response for another user's requests
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            # Same retry behaviour as a session built by spotipy, retrying rate limits (after Retry-After) and 5xx
+            retry = urllib3.Retry(
+                total=Spotify.max_retries,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                status=Spotify.max_retries,
+                backoff_factor=0.3,
+                status_forcelist=Spotify.default_retry_codes,
+                respect_retry_after_header=True)
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=current_app.config["SPOTIFY_HTTP_POOL_CONNECTIONS"],
+                pool_maxsize=current_app.config["SPOTIFY_HTTP_POOL_SIZE"],
+                max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if current_app.config["CACHE_REDIS_URL"] and current_app.config["SPOTIFY_RESPONSE_CACHE_TTL_SECONDS"] > 0:
+                session.response_cache = RedisResponseCache(
+                    current_app.config["CACHE_REDIS_URL"],
+                    current_app.config["SPOTIFY_RESPONSE_CACHE_TTL_SECONDS"])
+                session.current_user_response_cache_ttl = \
+                    current_app.config["SPOTIFY_CURRENT_USER_RESPONSE_CACHE_TTL_SECONDS"]
+            _shared_session = session
+            _shared_session_pid = os.getpid()
+        return _shared_session
+
 
 def create_auth_manager(current_app):
-    return SpotifyOAuth(requests_session=False,
+    return SpotifyOAuth(requests_session=get_shared_session(current_app),
                         client_id=current_app.config["SPOTIFY_CLIENT_ID"],
                         client_secret=current_app.config["SPOTIFY_CLIENT_SECRET"],
                         redirect_uri=current_app.config["SPOTIFY_REDIRECT_URI"],
@@ -25,7 +172,7 @@ def create_auth_manager_with_token(current_app, spotify_auth: SpotifyAuth):
 def create_auth_manager_with_token_dict(current_app, spotify_auth_dict: dict):
     cache = MemoryCacheHandler(token_info=spotify_auth_dict)
 
-    return SpotifyOAuth(requests_session=False,
+    return SpotifyOAuth(requests_session=get_shared_session(current_app),
                         client_id=current_app.config["SPOTIFY_CLIENT_ID"],
                         client_secret=current_app.config["SPOTIFY_CLIENT_SECRET"],
                         redirect_uri=current_app.config["SPOTIFY_REDIRECT_URI"],
@@ -36,6 +183,10 @@ def create_auth_manager_with_token_dict(current_app, spotify_auth_dict: dict):
                         cache_handler=cache)
 
 
+def create_spotify_client_with_auth_manager(current_app, auth_manager: SpotifyOAuth) -> Spotify:
+    return Spotify(auth_manager=auth_manager, requests_session=get_shared_session(current_app))
+
+
 def create_spotify_client(current_app, spotify_auth_dict) -> Spotify:
     auth_manager = create_auth_manager_with_token_dict(current_app, spotify_auth_dict)
-    return Spotify(auth_manager=auth_manager)
+    return create_spotify_client_with_auth_manager(current_app, auth_manager)
@@ -1,14 +1,14 @@
 from classes.spotify_auth import SpotifyAuth
 from tasks.analysis_tasks import aggregate_user_data, get_user_analysis, get_user_tracker_data
 from database import database
-import spotipy
 from bson import json_util
 import json
 
 from flask import current_app
 from exceptions.custom_exceptions import SpotifyAuthInvalid
-from services.spotify_client import create_auth_manager_with_token
+from services.spotify_client import create_auth_manager_with_token, create_spotify_client_with_auth_manager
 from tasks.task_state import get_celery_task_state
+from utils import util
 from utils.constants import RECENT_SHUFFLES_KEY
 
 LIKED_TRACKS_PLAYLIST_ID = "likedTracks"
@@ -26,10 +26,10 @@ def save_user(spotify_auth: SpotifyAuth, user_attributes):
     """
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         return {"error": "Invalid token"}, 400
-    user_id = spotify.me()["id"]
+    user_id = util.get_user_id(spotify, spotify_auth.to_dict())
     user_entry = {
         "spotify": {
             "expires_at": spotify_auth.expires_at,
@@ -59,10 +59,10 @@ def get_user(spotify_auth: SpotifyAuth):
     """
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         return {"error": "Invalid token"}, 400
-    user_id = spotify.me()["id"]
+    user_id = util.get_user_id(spotify, spotify_auth.to_dict())
     user = database.find_user(user_id)
 
     user_json = json.loads(json_util.dumps(user))
@@ -95,10 +95,10 @@ def handle_get_user_tracker_data(spotify_auth: SpotifyAuth, tracker_name):
     """
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         return {"error": "Invalid token"}, 400
-    user_id = spotify.me()["id"]
+    user_id = util.get_user_id(spotify, spotify_auth.to_dict())
     user = database.find_user(user_id)
     user_json = json.loads(json_util.dumps(user))
     try:
@@ -117,7 +117,7 @@ def handle_get_user_analysis(spotify_auth: SpotifyAuth):
     """
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         return {"error": "Invalid token"}, 400
     try:
@@ -135,14 +135,14 @@ def get_recent_shuffles(spotify_auth: SpotifyAuth):
     """
     auth_manager = create_auth_manager_with_token(
         current_app, spotify_auth)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth.to_dict()):
         raise SpotifyAuthInvalid("Invalid token")
-    user = spotify.me()
-    if user is None:
+    user_id = util.get_user_id(spotify, spotify_auth.to_dict())
+    if user_id is None:
         raise Exception("User not found in Spotify")
 
-    user_shuffle_counter_entry = database.find_shuffle_counter(user["id"])
+    user_shuffle_counter_entry = database.find_shuffle_counter(user_id)
 
     if user_shuffle_counter_entry is not None and user_shuffle_counter_entry[RECENT_SHUFFLES_KEY] is not None:
       recent_shuffles = user_shuffle_counter_entry[RECENT_SHUFFLES_KEY]
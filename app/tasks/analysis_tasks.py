@@ -3,16 +3,20 @@ from flask import current_app
 import spotipy
 from bson import json_util
 import json
-from datetime import datetime
+import heapq
+from collections import Counter
 
 from database import database
-from services.spotify_client import create_auth_manager_with_token_dict
-from utils import util
+from services.spotify_client import create_auth_manager_with_token_dict, create_spotify_client_with_auth_manager
+from utils import util, audio_features_cache_utils, audio_feature_matrix_utils
 
 TRACKERS_ENABLED_ATTRIBUTE_NAME = "trackers_enabled"
 TRACK_LIKED_TRACKS_ATTRIBUTE_NAME = "track_liked_tracks"
 TRACK_SHUFFLES_ATTRIBUTE_NAME = "track_shuffles"
 ANALYSE_LIBRARY_ATTRIBUTE_NAME = "analyse_library"
+TOP_TRACKS_COUNT = 10
+# Bump when the stored library analysis format changes so old entries are rebuilt
+LIBRARY_ANALYSIS_VERSION = 1
 
 @shared_task(bind=True, ignore_result=False)
 def aggregate_user_data(self, spotify_auth_dict: dict):
@@ -21,26 +25,20 @@ def aggregate_user_data(self, spotify_auth_dict: dict):
     """
     auth_manager = create_auth_manager_with_token_dict(
         current_app, spotify_auth_dict)
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
     if not auth_manager.validate_token(spotify_auth_dict):
         return {"error": "Invalid token"}, 400
-    user_id = spotify.me()["id"]
+    user_id = util.get_user_id(spotify, spotify_auth_dict)
     user = database.find_user(user_id)
     user_json = json.loads(json_util.dumps(user))
 
      # Increment counter for analysis count
     try:
-        overall_counter = database.find_shuffle_counter(
-            "overall_counter")
-        if overall_counter == None:
-            raise Exception("Couldn't find total shuffle counter")
-
-        overall_counter["analysis_count"] = int(
-            overall_counter["analysis_count"]) + 1
-
-        overall_counter_update = database.find_and_update_shuffle_counter(
+        overall_counter_update = database.increment_shuffle_counter(
             "overall_counter",
-            overall_counter)
+            {"analysis_count": 1})
+        if overall_counter_update.matched_count == 0:
+            raise Exception("Couldn't find total shuffle counter")
     except Exception as e:
         current_app.logger.error("Error updating overall shuffle count: " + str(e))
 
@@ -49,7 +47,7 @@ def aggregate_user_data(self, spotify_auth_dict: dict):
             "status": "success",
             TRACK_LIKED_TRACKS_ATTRIBUTE_NAME: get_user_tracker_data(self, user_id, user_json,
                                                                      TRACK_LIKED_TRACKS_ATTRIBUTE_NAME),
-            "analysis": get_user_analysis(self, current_app, spotify)
+            "analysis": get_user_analysis(self, current_app, spotify, user_id)
         }
     except Exception as e:
         current_app.logger.error("Error in aggregate_user_data: " + str(e))
@@ -82,12 +80,263 @@ def get_user_tracker_data(task, user_id, user_json, tracker_name):
     }
 
 
-def get_user_analysis(task, current_app, spotify: spotipy.Spotify):
-    # Get all tracks from library
-    all_tracks = util.get_all_tracks_with_data_from_playlist(task, 
-        spotify, util.LIKED_TRACKS_PLAYLIST_ID)
-    num_tracks = len(all_tracks)
+def get_user_analysis(task, current_app, spotify: spotipy.Spotify, user_id: str = None):
+    """
+    Analyse the user's Liked Songs
+    If user_id is given, the user's stored analysis is updated with only the tracks liked since it was stored,
+    falling back to analysing the whole library if the stored analysis can't be reconciled with the library
+    """
+    library_analysis = None
+    is_library_analysis_changed = True
+    if user_id is not None:
+        stored_library_analysis = find_stored_library_analysis(current_app, user_id)
+        if stored_library_analysis is not None:
+            library_analysis, is_library_analysis_changed = update_library_analysis(
+                task, current_app, spotify, stored_library_analysis)
+    if library_analysis is None:
+        library_analysis = build_library_analysis(
+            task, spotify, util.iterate_playlist_items(
+                task, spotify, util.LIKED_TRACKS_PLAYLIST_ID, current_app.config["SPOTIFY_FETCH_MAX_WORKERS"]))
+    if user_id is not None and is_library_analysis_changed:
+        save_library_analysis(current_app, user_id, library_analysis)
+    return get_library_analysis_response(library_analysis)
+
+
+def create_library_analysis():
+    """
+    Aggregates for a run of consecutive Liked Songs, newest first
+    Runs can be merged so only newly liked tracks need to be analysed
+    """
+    return {
+        "num_tracks": 0,
+        "total_length": 0,
+        "most_common_artists": {},
+        "most_common_albums": {},
+        "most_common_genre": {},
+        "release_year_counts": {},
+        # Bounded heaps keep only the 10 longest/shortest tracks while the library is streamed
+        # Longest entries are (duration, -index, track) and shortest (-duration, index, track), so ties at the cutoff
+        # keep the same tracks as taking the first/last 10 of a stable descending sort on duration:
+        # the earliest tied tracks for longest and the latest tied tracks for shortest
+        "longest_tracks_heap": [],
+        "shortest_tracks_heap": [],
+        "audio_features": create_audio_feature_scores(),
+        # Newest added_at and the ids of the tracks added at that time
+        "watermark_added_at": None,
+        "watermark_track_ids": []
+    }
+
+
+def build_library_analysis(task, spotify: spotipy.Spotify, tracks):
+    """
+    Analyse tracks, which must be in Liked Songs order (newest first)
+    Needed fields are pulled into compact columns as tracks are retrieved, then each count is made over its column
+    """
+    library_analysis = create_library_analysis()
+    track_columns = get_track_columns(task, tracks, library_analysis)
+    if library_analysis["num_tracks"] == 0:
+        return library_analysis
+
+    # Counter keeps names in first seen order, details are from the first track each name was seen in
+    for artist_name, count in Counter(track_columns["artist_names"]).items():
+        artist_id, artist_external_url, artist_image_url = track_columns["artist_details"][artist_name]
+        library_analysis["most_common_artists"][artist_name] = {
+            "id": artist_id,
+            "name": artist_name,
+            "external_url": artist_external_url,
+            "image": artist_image_url,
+            "count": count
+        }
+    for album_name, count in Counter(track_columns["album_names"]).items():
+        album_id, album_artist, album_external_url, album_image_url = track_columns["album_details"][album_name]
+        library_analysis["most_common_albums"][album_name] = {
+            "id": album_id,
+            "name": album_name,
+            "artist": album_artist,
+            "external_url": album_external_url,
+            "image": album_image_url,
+            "count": count
+        }
+    library_analysis["most_common_genre"] = dict(Counter(track_columns["genres"]))
+    library_analysis["release_year_counts"] = dict(Counter(
+        release_year for release_year in track_columns["release_years"] if release_year is not None))
+
+    try:
+        library_analysis["audio_features"] = sum_audio_features(task, spotify, track_columns["ids"])
+    except Exception as e:
+        current_app.logger.error("Failed while retrieving/calculating audio features: " + str(e))
+        raise Exception(
+            "Failed while retrieving/calculating audio features: " + str(e))
+    return library_analysis
+
+
+def get_track_columns(task, tracks, library_analysis: dict):
+    """
+    Pull the fields used by analysis from each track into columns, in one pass as tracks are retrieved
+    Track count, total length, watermark and longest/shortest heaps are updated in library_analysis as it goes
+    Only the tracks in the heaps are kept, artist and album details are kept once per name
+    """
+    track_columns = {
+        "ids": [],
+        "artist_names": [],
+        "artist_details": {},
+        "album_names": [],
+        "album_details": {},
+        "genres": [],
+        "release_years": []
+    }
+    artist_details = track_columns["artist_details"]
+    album_details = track_columns["album_details"]
+    longest_tracks_heap = library_analysis["longest_tracks_heap"]
+    shortest_tracks_heap = library_analysis["shortest_tracks_heap"]
+    num_tracks = 0
+    total_length = 0
+    is_watermark_run = True
+    artist = {}
+    progress_reporter = util.create_task_progress_reporter(task)
+    for track in tracks:
+        track_data = track["track"]
+        track_columns["ids"].append(track_data["id"])
+        if num_tracks == 0:
+            library_analysis["watermark_added_at"] = track.get("added_at")
+        # Tracks sharing the newest added_at come first
+        if is_watermark_run and track.get("added_at") == library_analysis["watermark_added_at"]:
+            library_analysis["watermark_track_ids"].append(track_data["id"])
+        else:
+            is_watermark_run = False
+        duration_ms = int(track_data["duration_ms"])
+        total_length += duration_ms
+        push_bounded_heap(longest_tracks_heap, (duration_ms, -num_tracks, track), TOP_TRACKS_COUNT)
+        push_bounded_heap(shortest_tracks_heap, (-duration_ms, num_tracks, track), TOP_TRACKS_COUNT)
+        num_tracks += 1
+
+        for artist in track_data["artists"]:
+            track_columns["artist_names"].append(artist["name"])
+            if artist["name"] not in artist_details:
+                artist_details[artist["name"]] = (
+                    artist["id"],
+                    artist["external_urls"]["spotify"],
+                    artist["images"][0]["url"] if "images" in artist else "")
+        album = track_data["album"]
+        track_columns["album_names"].append(album["name"])
+        if album["name"] not in album_details:
+            # Album image and artist are only used when the track's last artist has images/artists
+            album_details[album["name"]] = (
+                album["id"],
+                album["artists"][0]["name"] if "artists" in artist else "",
+                album["external_urls"]["spotify"],
+                album["images"][0]["url"] if "images" in artist else "")
+        if "genres" in album:
+            track_columns["genres"].extend(album["genres"])
+        track_columns["release_years"].append(get_release_year(album["release_date"]))
+        progress_reporter.update("Analysed " + str(num_tracks) + " tracks so far...")
+    progress_reporter.flush()
+    library_analysis["num_tracks"] = num_tracks
+    library_analysis["total_length"] = total_length
+    return track_columns
+
+
+def get_release_year(release_date: str):
+    """
+    Get the year of a YYYY, YYYY-MM or YYYY-MM-DD release date from its prefix
+    Return None if the year can't be read
+    """
+    if (release_date is None or len(release_date) < 4 or not release_date[:4].isdigit()
+            or (len(release_date) > 4 and release_date[4] != "-")):
+        return None
+    release_year = int(release_date[:4])
+    if release_year == 0:
+        return None
+    return release_year
 
+
+def update_library_analysis(task, current_app, spotify: spotipy.Spotify, stored_library_analysis: dict):
+    """
+    Analyse only the tracks liked since the stored analysis and merge them in
+    Return the analysis (None if the library must be analysed again) and whether it changed
+    """
+    latest_liked_tracks = spotify.current_user_saved_tracks(limit=1)
+    total = latest_liked_tracks["total"]
+    latest_added_at = None
+    latest_track_id = None
+    if len(latest_liked_tracks["items"]) > 0:
+        latest_added_at = latest_liked_tracks["items"][0]["added_at"]
+        latest_track_id = latest_liked_tracks["items"][0]["track"]["id"]
+    if (total == stored_library_analysis["num_tracks"]
+            and latest_added_at == stored_library_analysis["watermark_added_at"]
+            and (latest_track_id is None or latest_track_id in stored_library_analysis["watermark_track_ids"])):
+        current_app.logger.info("Liked Songs unchanged since stored analysis")
+        return stored_library_analysis, False
+
+    # Newly liked tracks come first, so stop at the first track older than the watermark
+    # Serial pages so no pages past the watermark are requested
+    new_tracks = []
+    watermark_added_at = stored_library_analysis["watermark_added_at"]
+    watermark_track_ids = set(stored_library_analysis["watermark_track_ids"])
+    if watermark_added_at is not None:
+        for track in util.iterate_playlist_items(task, spotify, util.LIKED_TRACKS_PLAYLIST_ID):
+            if track["added_at"] < watermark_added_at:
+                break
+            if track["added_at"] == watermark_added_at and track["track"]["id"] in watermark_track_ids:
+                continue
+            new_tracks.append(track)
+
+    # Removed tracks can't be found without reading the whole library
+    if stored_library_analysis["num_tracks"] + len(new_tracks) != total:
+        current_app.logger.info("Liked Songs total doesn't match stored analysis, analysing whole library")
+        return None, True
+
+    current_app.logger.info("Merging " + str(len(new_tracks)) + " new tracks into stored analysis")
+    return merge_library_analyses(build_library_analysis(task, spotify, new_tracks), stored_library_analysis), True
+
+
+def merge_library_analyses(newer: dict, older: dict):
+    """
+    Merge analyses of two consecutive runs of Liked Songs, giving the same result as analysing them together
+    Counts keep first seen order and first seen details, so newer entries come first
+    """
+    if newer["num_tracks"] == 0:
+        return older
+    if older["num_tracks"] == 0:
+        return newer
+    merged = create_library_analysis()
+    merged["num_tracks"] = newer["num_tracks"] + older["num_tracks"]
+    merged["total_length"] = newer["total_length"] + older["total_length"]
+    for counts_key in ["most_common_artists", "most_common_albums"]:
+        merged[counts_key] = {name: dict(entry) for name, entry in newer[counts_key].items()}
+        for name, entry in older[counts_key].items():
+            if name in merged[counts_key]:
+                merged[counts_key][name]["count"] += entry["count"]
+            else:
+                merged[counts_key][name] = dict(entry)
+    for counts_key in ["most_common_genre", "release_year_counts"]:
+        merged[counts_key] = dict(newer[counts_key])
+        for name, count in older[counts_key].items():
+            merged[counts_key][name] = merged[counts_key].get(name, 0) + count
+
+    # Older tracks come after the newer tracks, so shift their index
+    offset = newer["num_tracks"]
+    for duration, negative_index, track in newer["longest_tracks_heap"] + [
+            (duration, negative_index - offset, track) for duration, negative_index, track in older["longest_tracks_heap"]]:
+        push_bounded_heap(merged["longest_tracks_heap"], (duration, negative_index, track), TOP_TRACKS_COUNT)
+    for negative_duration, index, track in newer["shortest_tracks_heap"] + [
+            (negative_duration, index + offset, track) for negative_duration, index, track in older["shortest_tracks_heap"]]:
+        push_bounded_heap(merged["shortest_tracks_heap"], (negative_duration, index, track), TOP_TRACKS_COUNT)
+
+    merged["audio_features"] = [
+        merge_audio_feature_scores(newer_scores, older_scores)
+        for newer_scores, older_scores in zip(newer["audio_features"], older["audio_features"])
+    ]
+
+    merged["watermark_added_at"] = newer["watermark_added_at"]
+    merged["watermark_track_ids"] = list(newer["watermark_track_ids"])
+    if older["watermark_added_at"] == newer["watermark_added_at"]:
+        merged["watermark_track_ids"] += older["watermark_track_ids"]
+    return merged
+
+
+def get_library_analysis_response(library_analysis: dict):
+    num_tracks = library_analysis["num_tracks"]
     if num_tracks == 0:
         return {
             "num_tracks": num_tracks,
@@ -113,94 +362,11 @@ def get_user_analysis(task, current_app, spotify: spotipy.Spotify):
             # "all_time_top_tracks": []
         }
 
-    most_common_artists = {}
-    most_common_albums = {}
-    most_common_genre = {}
-    total_length = 0
-    average_track_length = 0
-    sorted_tracks = sorted(all_tracks, key=lambda track: int(track["track"]["duration_ms"]), reverse=True)
-    top_10_longest_tracks = sorted_tracks[:10]
-    top_10_shortest_tracks = sorted(sorted_tracks[len(sorted_tracks)-10:], key=lambda track: int(track["track"]["duration_ms"]))
-    release_year_counts = {}
-
-    # TODO Find oldest and newest tracks
-    # oldest_release_date_track = {}
-    # latest_release_date_track = {}
-    all_tracks_ids = []
+    top_10_longest_tracks = [entry[2] for entry in sorted(library_analysis["longest_tracks_heap"], reverse=True)]
+    top_10_shortest_tracks = [entry[2] for entry in sorted(library_analysis["shortest_tracks_heap"],
+                                                           key=lambda entry: (-entry[0], entry[1]))]
 
-    counter = 1
-
-    for track in all_tracks: 
-        track_data = track["track"]
-        all_tracks_ids.append(track_data["id"])
-        # Most common artist
-        for artist in track_data["artists"]:
-            if artist["name"] in most_common_artists:
-                most_common_artists[artist["name"]]["count"] += 1
-            else:
-                artist_image_url = ""
-                if "images" in artist:
-                    artist_image_url = artist["images"][0]["url"]
-                most_common_artists[artist["name"]] = {
-                    "id": artist["id"],
-                    "name": artist["name"],
-                    "external_url": artist["external_urls"]["spotify"],
-                    "image": artist_image_url,
-                    "count": 1
-                }
-        # Most common album
-        album = track_data["album"]
-        if album["name"] in most_common_albums:
-            most_common_albums[album["name"]]["count"] += 1
-        else:
-            album_image_url = ""
-            if "images" in artist:
-                album_image_url = album["images"][0]["url"]
-            album_artist = ""
-            if "artists" in artist:
-                album_artist = album["artists"][0]["name"]
-            most_common_albums[album["name"]] = {
-                "id": album["id"],
-                "name": album["name"],
-                "artist": album_artist,
-                "external_url": album["external_urls"]["spotify"],
-                "image": album_image_url,
-                "count": 1
-            }
-        # Most common genre
-        if "genres" in album:
-            for genre in album["genres"]:
-                if genre in most_common_genre:
-                    most_common_genre[genre] += 1
-                else:
-                    most_common_genre[genre] = 1
-        # Average track length
-        total_length += int(track_data["duration_ms"])
-        # Release date
-        release_date = album["release_date"]
-
-        try:
-            release_date_object = datetime.strptime(release_date, '%Y-%m-%d').date()
-            if release_date_object.year in release_year_counts:
-                release_year_counts[release_date_object.year] += 1
-            else:
-                release_year_counts[release_date_object.year] = 1
-        except Exception as e:
-            try:
-                release_date_object = datetime.strptime(release_date, '%Y').date()
-                if release_date_object.year in release_year_counts:
-                    release_year_counts[release_date_object.year] += 1
-                else:
-                    release_year_counts[release_date_object.year] = 1
-            except Exception as e:
-                release_date_object = datetime.strptime(release_date, '%Y-%m').date()
-                if release_date_object.year in release_year_counts:
-                    release_year_counts[release_date_object.year] += 1
-                else:
-                    release_year_counts[release_date_object.year] = 1
-        util.update_task_progress(task, state='PROGRESS', meta={'progress': {'state': "Analysed " + str(counter) + " tracks so far..."}})
-        counter = counter + 1
-    
+    total_length = library_analysis["total_length"]
     average_track_length = total_length / num_tracks
     average_track_length_seconds, average_track_length_minutes, average_track_length_hours, average_track_length_days = util.calcFromMillis(
         average_track_length)
@@ -214,22 +380,15 @@ def get_user_analysis(task, current_app, spotify: spotipy.Spotify):
     #     limit=50, time_range="long_term")["items"]
 
     most_common_artists_array = []
-    for v in most_common_artists.values():
+    for v in library_analysis["most_common_artists"].values():
         most_common_artists_array.append(v)
     most_common_albums_array = []
-    for v in most_common_albums.values():
+    for v in library_analysis["most_common_albums"].values():
         most_common_albums_array.append(v)
     most_common_genre_array = []
-    for k, v in most_common_genre.items():
+    for k, v in library_analysis["most_common_genre"].items():
         most_common_genre_array.append({"name": k, "count": v})
 
-    try:
-        audio_features = average_audio_features(task, spotify, all_tracks_ids)
-    except Exception as e:
-        current_app.logger.error("Failed while retrieving/calculating audio features: " + str(e))
-        raise Exception(
-            "Failed while retrieving/calculating audio features: " + str(e))
-
     return {
         "num_tracks": num_tracks,
         "num_artists": len(most_common_artists_array),
@@ -251,12 +410,79 @@ def get_user_analysis(task, current_app, spotify: spotipy.Spotify):
         },
         "longest_tracks": process_multiple_tracks(top_10_longest_tracks),
         "shortest_tracks": process_multiple_tracks(top_10_shortest_tracks),
-        "release_year_counts": release_year_counts,
-        "audio_features": audio_features
+        "release_year_counts": library_analysis["release_year_counts"],
+        "audio_features": get_average_audio_features(library_analysis["audio_features"], num_tracks)
         # "all_time_top_artists": all_time_top_artists,
         # "all_time_top_tracks": all_time_top_tracks
     }
 
+
+def find_stored_library_analysis(current_app, user_id: str):
+    try:
+        library_analysis_entry = database.find_library_analysis(user_id)
+        if library_analysis_entry is None or library_analysis_entry.get("version") != LIBRARY_ANALYSIS_VERSION:
+            return None
+        return deserialize_library_analysis(library_analysis_entry)
+    except Exception as e:
+        current_app.logger.error("Error reading stored library analysis: " + str(e))
+        return None
+
+
+def save_library_analysis(current_app, user_id: str, library_analysis: dict):
+    try:
+        database.find_and_update_library_analysis(user_id, serialize_library_analysis(library_analysis))
+    except Exception as e:
+        current_app.logger.error("Error saving library analysis: " + str(e))
+
+
+def serialize_library_analysis(library_analysis: dict):
+    """
+    Convert analysis into a database entry
+    Counts are stored as [key, value] pairs as names may not be valid field names and years are ints
+    """
+    return {
+        "version": LIBRARY_ANALYSIS_VERSION,
+        "num_tracks": library_analysis["num_tracks"],
+        "total_length": library_analysis["total_length"],
+        "most_common_artists": list(library_analysis["most_common_artists"].values()),
+        "most_common_albums": list(library_analysis["most_common_albums"].values()),
+        "most_common_genre": [[k, v] for k, v in library_analysis["most_common_genre"].items()],
+        "release_year_counts": [[k, v] for k, v in library_analysis["release_year_counts"].items()],
+        "longest_tracks_heap": [list(entry) for entry in library_analysis["longest_tracks_heap"]],
+        "shortest_tracks_heap": [list(entry) for entry in library_analysis["shortest_tracks_heap"]],
+        "audio_features": [
+            {
+                "total_score": scores.total_score,
+                "highest_feature_score": scores.highest_feature_score,
+                "lowest_feature_score": scores.lowest_feature_score
+            } for scores in library_analysis["audio_features"]
+        ],
+        "watermark_added_at": library_analysis["watermark_added_at"],
+        "watermark_track_ids": library_analysis["watermark_track_ids"]
+    }
+
+
+def deserialize_library_analysis(library_analysis_entry: dict):
+    library_analysis = create_library_analysis()
+    library_analysis["num_tracks"] = library_analysis_entry["num_tracks"]
+    library_analysis["total_length"] = library_analysis_entry["total_length"]
+    library_analysis["most_common_artists"] = {
+        entry["name"]: entry for entry in library_analysis_entry["most_common_artists"]}
+    library_analysis["most_common_albums"] = {
+        entry["name"]: entry for entry in library_analysis_entry["most_common_albums"]}
+    library_analysis["most_common_genre"] = {k: v for k, v in library_analysis_entry["most_common_genre"]}
+    library_analysis["release_year_counts"] = {k: v for k, v in library_analysis_entry["release_year_counts"]}
+    library_analysis["longest_tracks_heap"] = [tuple(entry) for entry in library_analysis_entry["longest_tracks_heap"]]
+    library_analysis["shortest_tracks_heap"] = [tuple(entry) for entry in library_analysis_entry["shortest_tracks_heap"]]
+    for scores, stored_scores in zip(library_analysis["audio_features"], library_analysis_entry["audio_features"]):
+        scores.total_score = stored_scores["total_score"]
+        scores.highest_feature_score = stored_scores["highest_feature_score"]
+        scores.lowest_feature_score = stored_scores["lowest_feature_score"]
+    library_analysis["watermark_added_at"] = library_analysis_entry["watermark_added_at"]
+    library_analysis["watermark_track_ids"] = library_analysis_entry["watermark_track_ids"]
+    return library_analysis
+
+
 class TrackFeatureScoreData:
     def __init__(self, feature_name, feature_description):
         self.feature_name = feature_name
@@ -266,12 +492,6 @@ class TrackFeatureScoreData:
         self.highest_feature_score = prep_audio_feature_track("", 0)
         self.lowest_feature_score = prep_audio_feature_track("", 0)
 
-    def update_scores(self, track):
-        if self.highest_feature_score["id"] == "" or track[self.feature_name] > self.highest_feature_score["value"]:
-            self.highest_feature_score = prep_audio_feature_track(track["id"], track[self.feature_name])
-        if self.lowest_feature_score["id"] == "" or track[self.feature_name] < self.lowest_feature_score["value"]:
-            self.lowest_feature_score = prep_audio_feature_track(track["id"], track[self.feature_name])
-
     def to_dict(self):
         return {
             'feature_name': self.feature_name,
@@ -282,68 +502,79 @@ class TrackFeatureScoreData:
             'lowest_feature_score': self.lowest_feature_score
         }
 
-def average_audio_features(task, spotify: spotipy.Spotify, tracks_ids):
-    all_audio_features = util.get_all_track_audio_features(task, spotify, tracks_ids)
-    acousticness_scores = TrackFeatureScoreData("acousticness", """A confidence measure from 0.0 to 1.0 of whether the track is acoustic. 1.0 represents high confidence the track is acoustic.""")
-    danceability_scores = TrackFeatureScoreData("danceability", """Danceability describes how suitable a track is for dancing based on a combination of musical elements including tempo, rhythm stability, beat strength, and overall regularity. A value of 0.0 is least danceable and 1.0 is most danceable.""")
-    energy_scores = TrackFeatureScoreData("energy", """Energy is a measure from 0.0 to 1.0 and represents a perceptual measure of intensity and activity. Typically, energetic tracks feel fast, loud, and noisy.""")
-    instrumentalness_scores = TrackFeatureScoreData("instrumentalness", """Predicts whether a track contains no vocals. "Ooh" and "aah" sounds are treated as instrumental in this context. Rap or spoken word tracks are clearly "vocal". The closer the instrumentalness value is to 1.0, the greater likelihood the track contains no vocal content. Values above 0.5 are intended to represent instrumental tracks, but confidence is higher as the value approaches 1.0.""")
-    liveness_scores = TrackFeatureScoreData("liveness", """Detects the presence of an audience in the recording. Higher liveness values represent an increased probability that the track was performed live. A value above 0.8 provides strong likelihood that the track is live.""")
-    loudness_scores = TrackFeatureScoreData("loudness", """The overall loudness of a track in decibels (dB). Loudness values are averaged across the entire track and are useful for comparing relative loudness of tracks. Loudness is the quality of a sound that is the primary psychological correlate of physical strength (amplitude). Values typically range between -60 and 0 db.""")
-    speechiness_scores = TrackFeatureScoreData("speechiness", """Speechiness detects the presence of spoken words in a track. The more exclusively speech-like the recording (e.g. talk show, audio book, poetry), the closer to 1.0 the attribute value. Values above 0.66 describe tracks that are probably made entirely of spoken words. Values between 0.33 and 0.66 describe tracks that may contain both music and speech, either in sections or layered, including such cases as rap music. Values below 0.33 most likely represent music and other non-speech-like tracks.""")
-    tempo_scores = TrackFeatureScoreData("tempo", """The overall estimated tempo of a track in beats per minute (BPM). In musical terminology, tempo is the speed or pace of a given piece and derives directly from the average beat duration.""")
-    valence_scores = TrackFeatureScoreData("valence", """A measure from 0.0 to 1.0 describing the musical positiveness conveyed by a track. Tracks with high valence sound more positive (e.g. happy, cheerful, euphoric), while tracks with low valence sound more negative (e.g. sad, depressed, angry).""")
-
-    for track in all_audio_features:
-        if track is not None:
-            process_track_feature(track, "acousticness", acousticness_scores)
-            process_track_feature(track, "danceability", danceability_scores)
-            process_track_feature(track, "energy", energy_scores)
-            process_track_feature(track, "instrumentalness", instrumentalness_scores)
-            process_track_feature(track, "liveness", liveness_scores)
-            process_track_feature(track, "loudness", loudness_scores)
-            process_track_feature(track, "speechiness", speechiness_scores)
-            process_track_feature(track, "tempo", tempo_scores)
-            process_track_feature(track, "valence", valence_scores)
-
-    # Update averages
-    num_tracks = len(tracks_ids)
-    acousticness_scores.average_score = acousticness_scores.total_score / num_tracks
-    danceability_scores.average_score = danceability_scores.total_score / num_tracks
-    energy_scores.average_score = energy_scores.total_score / num_tracks
-    instrumentalness_scores.average_score = instrumentalness_scores.total_score / num_tracks
-    liveness_scores.average_score = liveness_scores.total_score / num_tracks
-    loudness_scores.average_score = loudness_scores.total_score / num_tracks
-    speechiness_scores.average_score = speechiness_scores.total_score / num_tracks
-    tempo_scores.average_score = tempo_scores.total_score / num_tracks
-    valence_scores.average_score = valence_scores.total_score / num_tracks
-
-    all_features = [
-        acousticness_scores.to_dict(),
-        danceability_scores.to_dict(),
-        energy_scores.to_dict(),
-        instrumentalness_scores.to_dict(),
-        liveness_scores.to_dict(),
-        loudness_scores.to_dict(),
-        speechiness_scores.to_dict(),
-        tempo_scores.to_dict(),
-        valence_scores.to_dict()
+
+def create_audio_feature_scores():
+    return [
+        TrackFeatureScoreData("acousticness", """A confidence measure from 0.0 to 1.0 of whether the track is acoustic. 1.0 represents high confidence the track is acoustic."""),
+        TrackFeatureScoreData("danceability", """Danceability describes how suitable a track is for dancing based on a combination of musical elements including tempo, rhythm stability, beat strength, and overall regularity. A value of 0.0 is least danceable and 1.0 is most danceable."""),
+        TrackFeatureScoreData("energy", """Energy is a measure from 0.0 to 1.0 and represents a perceptual measure of intensity and activity. Typically, energetic tracks feel fast, loud, and noisy."""),
+        TrackFeatureScoreData("instrumentalness", """Predicts whether a track contains no vocals. "Ooh" and "aah" sounds are treated as instrumental in this context. Rap or spoken word tracks are clearly "vocal". The closer the instrumentalness value is to 1.0, the greater likelihood the track contains no vocal content. Values above 0.5 are intended to represent instrumental tracks, but confidence is higher as the value approaches 1.0."""),
+        TrackFeatureScoreData("liveness", """Detects the presence of an audience in the recording. Higher liveness values represent an increased probability that the track was performed live. A value above 0.8 provides strong likelihood that the track is live."""),
+        TrackFeatureScoreData("loudness", """The overall loudness of a track in decibels (dB). Loudness values are averaged across the entire track and are useful for comparing relative loudness of tracks. Loudness is the quality of a sound that is the primary psychological correlate of physical strength (amplitude). Values typically range between -60 and 0 db."""),
+        TrackFeatureScoreData("speechiness", """Speechiness detects the presence of spoken words in a track. The more exclusively speech-like the recording (e.g. talk show, audio book, poetry), the closer to 1.0 the attribute value. Values above 0.66 describe tracks that are probably made entirely of spoken words. Values between 0.33 and 0.66 describe tracks that may contain both music and speech, either in sections or layered, including such cases as rap music. Values below 0.33 most likely represent music and other non-speech-like tracks."""),
+        TrackFeatureScoreData("tempo", """The overall estimated tempo of a track in beats per minute (BPM). In musical terminology, tempo is the speed or pace of a given piece and derives directly from the average beat duration."""),
+        TrackFeatureScoreData("valence", """A measure from 0.0 to 1.0 describing the musical positiveness conveyed by a track. Tracks with high valence sound more positive (e.g. happy, cheerful, euphoric), while tracks with low valence sound more negative (e.g. sad, depressed, angry).""")
     ]
 
+
+def sum_audio_features(task, spotify: spotipy.Spotify, tracks_ids):
+    """
+    Total and find the highest and lowest score of each audio feature for the tracks
+    """
+    all_audio_features = audio_features_cache_utils.get_all_track_audio_features_with_cache(task, spotify, tracks_ids)
+    audio_feature_scores = create_audio_feature_scores()
+    feature_summaries = audio_feature_matrix_utils.summarise_audio_features(
+        all_audio_features, [feature_scores.feature_name for feature_scores in audio_feature_scores])
+    for feature_scores, feature_summary in zip(audio_feature_scores, feature_summaries):
+        feature_scores.total_score = feature_summary["total_score"]
+        feature_scores.highest_feature_score = feature_summary["highest_feature_score"]
+        feature_scores.lowest_feature_score = feature_summary["lowest_feature_score"]
+    return audio_feature_scores
+
+
+def merge_audio_feature_scores(newer: TrackFeatureScoreData, older: TrackFeatureScoreData):
+    """
+    Merge scores of two runs of tracks, newer scores win ties as they would be processed first
+    """
+    merged = TrackFeatureScoreData(newer.feature_name, newer.feature_description)
+    merged.total_score = newer.total_score + older.total_score
+    merged.highest_feature_score = newer.highest_feature_score
+    if newer.highest_feature_score["id"] == "" or (
+            older.highest_feature_score["id"] != ""
+            and older.highest_feature_score["value"] > newer.highest_feature_score["value"]):
+        merged.highest_feature_score = older.highest_feature_score
+    merged.lowest_feature_score = newer.lowest_feature_score
+    if newer.lowest_feature_score["id"] == "" or (
+            older.lowest_feature_score["id"] != ""
+            and older.lowest_feature_score["value"] < newer.lowest_feature_score["value"]):
+        merged.lowest_feature_score = older.lowest_feature_score
+    return merged
+
+
+def get_average_audio_features(audio_feature_scores, num_tracks: int):
+    all_features = []
+    for feature_scores in audio_feature_scores:
+        feature_scores.average_score = feature_scores.total_score / num_tracks
+        all_features.append(feature_scores.to_dict())
     return all_features
 
+
+def push_bounded_heap(heap, entry, size):
+    """
+    Push entry onto min heap, dropping the smallest entry once heap holds size entries
+    """
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    else:
+        heapq.heappushpop(heap, entry)
+
+
 def prep_audio_feature_track(id, value):
     return {
         "id": id,
         "value": value
     }
 
-def process_track_feature(track, feature_name, feature_score_data):
-    if feature_name in track and track[feature_name] is not None:
-        feature_score_data.total_score += track[feature_name]
-        feature_score_data.update_scores(track)
-        
-
 def process_multiple_tracks(tracks):
     processed_tracks = []
     for track_data in tracks:
@@ -1,12 +1,14 @@
 import time
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timezone
 from celery import shared_task
 import random
 from flask import current_app
 
 from database import database
 from services.spotify_client import create_spotify_client
-from utils import util, tracker_utils
+from utils import util, tracker_utils, playlist_cache_utils
+from utils.constants import SHUFFLED_PLAYLIST_ID_KEY, SHUFFLED_PLAYLIST_URI_KEY, LAST_UPDATED_KEY
 
 SHUFFLED_PLAYLIST_PREFIX = "[Shuffled] "
 LIKED_TRACKS_PLAYLIST_ID = "likedTracks"
@@ -14,19 +16,27 @@ TRACK_SHUFFLES_ATTRIBUTE_NAME = "track_shuffles"
 
 
 @shared_task(bind=True, ignore_result=False, expires=60)
-def shuffle_playlist(self, spotify_auth_dict: dict, playlist_id, playlist_name):
+def shuffle_playlist(self, spotify_auth_dict: dict, playlist_id, playlist_name, make_new_playlist=True):
+    """
+    Shuffle tracks from playlist into the user's shuffled playlist
+    If make_new_playlist is False and a shuffled playlist already exists, its tracks are replaced in place
+    Otherwise the existing shuffled playlist is removed and a new one is created
+    """
     spotify_client = create_spotify_client(current_app, spotify_auth_dict)
 
     # Store start time to calculate duration
     start_time = time.time()
 
-    # Grab all tracks from playlist
-    all_tracks = util.get_tracks_from_playlist(self, spotify_client, playlist_id)
+    user_id = util.get_user_id(spotify_client, spotify_auth_dict)
+
+    # Grab all tracks from playlist, reusing cached tracks if the playlist is unchanged
+    all_tracks = playlist_cache_utils.get_tracks_from_playlist_with_cache(
+        self, spotify_client, playlist_id, user_id, current_app.config["SPOTIFY_FETCH_MAX_WORKERS"])
     if all_tracks is None or len(all_tracks) == 0:
         return {"error": "No tracks found for playlist " + playlist_id}
 
     # Check if user exists
-    user = database.find_user(spotify_client.me()["id"])
+    user = database.find_user(user_id)
     if user is None:
         return {"error": "No user found"}
 
@@ -37,23 +47,35 @@ def shuffle_playlist(self, spotify_auth_dict: dict, playlist_id, playlist_name):
     )
     random.shuffle(all_tracks)
 
-    # Check if shuffled playlist exists and remove
-    user_playlists = spotify_client.current_user_playlists()
-    for playlist in user_playlists["items"]:
-        if playlist["name"] == (SHUFFLED_PLAYLIST_PREFIX + playlist_name):
-            spotify_client.current_user_unfollow_playlist(playlist["id"])
-            break
-
-    response = util.create_new_playlist_with_tracks(
-        self,
-        spotify_client,
-        SHUFFLED_PLAYLIST_PREFIX + playlist_name,
-        False,
-        "Shuffled by True Shuffle",
-        all_tracks
-    )
+    # Check if shuffled playlist exists
+    existing_shuffled_playlist = find_existing_shuffled_playlist(spotify_client, user_id, playlist_id, playlist_name)
+
+    if existing_shuffled_playlist is not None and make_new_playlist is False:
+        # Reuse existing shuffled playlist
+        response = util.replace_playlist_tracks(
+            self,
+            spotify_client,
+            existing_shuffled_playlist[SHUFFLED_PLAYLIST_ID_KEY],
+            existing_shuffled_playlist[SHUFFLED_PLAYLIST_URI_KEY],
+            all_tracks
+        )
+    else:
+        if existing_shuffled_playlist is not None:
+            spotify_client.current_user_unfollow_playlist(existing_shuffled_playlist[SHUFFLED_PLAYLIST_ID_KEY])
+
+        response = util.create_new_playlist_with_tracks(
+            self,
+            spotify_client,
+            SHUFFLED_PLAYLIST_PREFIX + playlist_name,
+            False,
+            "Shuffled by True Shuffle",
+            all_tracks,
+            user_id
+        )
+
+    if response is not None and response.get("status") == "success":
+        save_shuffled_playlist(user_id, playlist_id, response)
 
-    if response is not None and response["status"] == "success":
         # Calculate duration of process
         duration_seconds = int(time.time() - start_time)
 
@@ -66,11 +88,111 @@ def shuffle_playlist(self, spotify_auth_dict: dict, playlist_id, playlist_name):
     return response
 
 
+@shared_task(bind=True, ignore_result=False, expires=60)
+def delete_all_shuffled_playlists(self, spotify_auth_dict: dict):
+    """
+    Unfollow all of the user's shuffled playlists
+    Playlists are unfollowed concurrently, up to SPOTIFY_UNFOLLOW_MAX_WORKERS at a time
+    Rate limited unfollows are retried by the shared session after their Retry-After period
+    """
+    spotify_client = create_spotify_client(current_app, spotify_auth_dict)
+    user_id = util.get_user_id(spotify_client, spotify_auth_dict)
+
+    # Search all user playlists for shuffled playlists
+    util.update_task_progress(self, state='PROGRESS', meta={'progress': {'state': "Searching for shuffled playlists..."}})
+    shuffled_playlist_ids = [
+        playlist["id"] for playlist in util.iterate_user_playlists(spotify_client)
+        if str(playlist["name"]).startswith(SHUFFLED_PLAYLIST_PREFIX)
+    ]
+
+    deleted_playlists = []
+    failed_playlists = []
+    if len(shuffled_playlist_ids) > 0:
+        max_workers = max(1, min(current_app.config["SPOTIFY_UNFOLLOW_MAX_WORKERS"], len(shuffled_playlist_ids)))
+        progress_reporter = util.create_task_progress_reporter(self)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            unfollow_futures = {
+                executor.submit(spotify_client.current_user_unfollow_playlist, shuffled_playlist_id):
+                    shuffled_playlist_id
+                for shuffled_playlist_id in shuffled_playlist_ids
+            }
+            for unfollow_future in as_completed(unfollow_futures):
+                shuffled_playlist_id = unfollow_futures[unfollow_future]
+                try:
+                    unfollow_future.result()
+                    deleted_playlists.append(shuffled_playlist_id)
+                except Exception as e:
+                    current_app.logger.error(
+                        "Error while deleting shuffled playlist " + shuffled_playlist_id + ": " + str(e))
+                    failed_playlists.append(shuffled_playlist_id)
+                progress_reporter.update(
+                    "Deleted " + str(len(deleted_playlists)) + "/" + str(len(shuffled_playlist_ids))
+                    + " shuffled playlists...",
+                    len(deleted_playlists) + len(failed_playlists), len(shuffled_playlist_ids))
+
+    # Playlists which failed to unfollow are still the user's, so keep their index entries
+    if len(deleted_playlists) > 0:
+        try:
+            database.delete_user_shuffled_playlists(user_id, deleted_playlists)
+        except Exception as e:
+            current_app.logger.error("Error clearing shuffled playlist index: " + str(e))
+
+    delete_success_log = "User: {user_id} -- Deleted {num_deleted_playlists:d} playlist(s): {deleted_playlists_list}"
+    current_app.logger.info(delete_success_log.format(user_id=user_id, num_deleted_playlists=len(
+        deleted_playlists), deleted_playlists_list=str(deleted_playlists)))
+    return {
+        "status": "success",
+        "deleted_playlists_count": len(deleted_playlists),
+        "failed_playlists_count": len(failed_playlists)
+    }
+
+
+def find_existing_shuffled_playlist(spotify_client, user_id: str, playlist_id: str, playlist_name: str):
+    """
+    Find the user's shuffled playlist for playlist_id
+    Check the shuffled playlist index first, falling back to searching all user playlists by name
+    Return entry with shuffled playlist id and uri, or None if not found
+    """
+    try:
+        shuffled_playlist_entry = database.find_shuffled_playlist(user_id, playlist_id)
+        # Skip entries for shuffled playlists the user has since removed
+        if (
+            shuffled_playlist_entry is not None
+            and spotify_client.playlist_is_following(shuffled_playlist_entry[SHUFFLED_PLAYLIST_ID_KEY], [user_id])[0]
+        ):
+            return shuffled_playlist_entry
+    except Exception as e:
+        current_app.logger.error("Error while searching shuffled playlist index: " + str(e))
+
+    for playlist in util.iterate_user_playlists(spotify_client):
+        if playlist["name"] == (SHUFFLED_PLAYLIST_PREFIX + playlist_name):
+            return {
+                SHUFFLED_PLAYLIST_ID_KEY: playlist["id"],
+                SHUFFLED_PLAYLIST_URI_KEY: playlist.get("external_urls", {}).get("spotify")
+            }
+    return None
+
+
+def save_shuffled_playlist(user_id: str, playlist_id: str, response: dict):
+    """
+    Store shuffled playlist created for playlist_id so it can be found without searching user playlists
+    """
+    try:
+        database.find_and_update_shuffled_playlist(user_id, playlist_id, {
+            SHUFFLED_PLAYLIST_ID_KEY: response["playlist_id"],
+            SHUFFLED_PLAYLIST_URI_KEY: response["playlist_uri"],
+            LAST_UPDATED_KEY: datetime.now(timezone.utc)
+        })
+    except Exception as e:
+        current_app.logger.error("Error updating shuffled playlist index: " + str(e))
+
+
 @shared_task(bind=True, ignore_result=False, expires=60)
 def create_playlist_from_liked_tracks(self, spotify_auth_dict: dict, new_playlist_name):
     spotify_client = create_spotify_client(current_app, spotify_auth_dict)
 
-    all_tracks = util.get_tracks_from_playlist(self, spotify_client, LIKED_TRACKS_PLAYLIST_ID)
+    all_tracks = util.get_tracks_from_playlist(
+        self, spotify_client, LIKED_TRACKS_PLAYLIST_ID, current_app.config["SPOTIFY_FETCH_MAX_WORKERS"])
     if all_tracks is None or len(all_tracks) == 0:
         return {"error": "No tracks found for user's liked songs"}
 
@@ -82,5 +204,6 @@ def create_playlist_from_liked_tracks(self, spotify_auth_dict: dict, new_playlis
         new_playlist_name,
         True,
         "True Shuffle | My Liked Tracks from " + today.strftime("%d/%m/%Y"),
-        all_tracks
+        all_tracks,
+        util.get_user_id(spotify_client, spotify_auth_dict)
     )
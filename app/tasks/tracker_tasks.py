@@ -0,0 +1,236 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from celery import shared_task
+from flask import current_app
+from pymongo.errors import BulkWriteError
+
+from classes.token_bucket import TokenBucket
+from database import database
+from services.spotify_client import create_auth_manager_with_token_dict, create_spotify_client_with_auth_manager
+from utils import util, token_utils
+from utils.constants import USER_ID_KEY
+
+TRACKERS_ENABLED_ATTRIBUTE_NAME = "trackers_enabled"
+LIKED_TRACKS_ETAG_KEY = "liked_tracks_etag"
+TRACK_SHUFFLES_ATTRIBUTE_NAME = "track_shuffles"
+USER_LIKED_TRACKS_TRACKER_LOG = "Tracker: {tracker} -- User: {user_id} -- {status}"
+SUCCESSFUL_UPDATES_LOG = (
+    "Tracker: {tracker} -- Successfully updated {success_counter} users "
+    + "out of {total_enabled_users} users"
+)
+
+# Outcomes of updating a single user's tracker
+TRACKER_UPDATED = "updated"
+TRACKER_INVALID_USER_ENTRY = "invalid_user_entry"
+TRACKER_INVALID_TOKEN = "invalid_token"
+TRACKER_COUNT_FAILED = "count_failed"
+TRACKER_PREVIOUS_ENTRY_FAILED = "previous_entry_failed"
+TRACKER_INSERT_FAILED = "insert_failed"
+TRACKER_ERROR = "error"
+TRACKER_OUTCOMES = [
+    TRACKER_UPDATED, TRACKER_INVALID_USER_ENTRY, TRACKER_INVALID_TOKEN, TRACKER_COUNT_FAILED,
+    TRACKER_PREVIOUS_ENTRY_FAILED, TRACKER_INSERT_FAILED, TRACKER_ERROR
+]
+
+
+@shared_task(bind=True, ignore_result=False)
+def update_all_user_trackers(self):
+    """
+    For each user who has tracker enabled, check latest liked tracks count and store.
+    Users are updated concurrently, up to TRACKER_UPDATE_MAX_WORKERS at a time,
+    and started at no more than TRACKER_UPDATE_RATE_PER_SECOND across all workers.
+    Previous counts are read in one aggregation and new entries are inserted in batches of TRACKER_INSERT_BATCH_SIZE.
+    Skip users who error
+    """
+    users = list(database.get_all_users_with_attribute(
+        TRACKERS_ENABLED_ATTRIBUTE_NAME, True))
+    total_users = len(users)
+    outcomes = {outcome: 0 for outcome in TRACKER_OUTCOMES}
+    util.update_task_progress(self, state='PROGRESS', meta={
+        'progress': get_tracker_progress(0, total_users, outcomes)})
+
+    if total_users > 0:
+        # Find previous entries to calculate difference
+        # For a new user, first entry difference will be 0
+        try:
+            latest_counts = database.find_users_latest_liked_tracks_counts(
+                [user[USER_ID_KEY] for user in users if USER_ID_KEY in user])
+        except Exception as e:
+            current_app.logger.error("Error while searching for previous tracker entries: " + str(e))
+            outcomes[TRACKER_PREVIOUS_ENTRY_FAILED] = total_users
+            return get_tracker_result(total_users, outcomes)
+
+        app = current_app._get_current_object()
+        limiter = TokenBucket(current_app.config["TRACKER_UPDATE_RATE_PER_SECOND"],
+                              current_app.config["TRACKER_UPDATE_BURST"])
+        max_workers = max(1, min(current_app.config["TRACKER_UPDATE_MAX_WORKERS"], total_users))
+        insert_batch_size = current_app.config["TRACKER_INSERT_BATCH_SIZE"]
+        pending_tracker_entries = []
+        progress_reporter = util.create_task_progress_reporter(self)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tracker_futures = {
+                executor.submit(get_user_tracker_entry_with_limit, app, limiter, user, latest_counts): user
+                for user in users
+            }
+            for processed_count, tracker_future in enumerate(as_completed(tracker_futures), start=1):
+                try:
+                    outcome, tracker_entry, liked_tracks_etag = tracker_future.result()
+                except Exception as e:
+                    user = tracker_futures[tracker_future]
+                    tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                                   user.get(USER_ID_KEY, "missing id"), "Error while updating tracker " + str(e),
+                                   level="error")
+                    outcome, tracker_entry, liked_tracks_etag = TRACKER_ERROR, None, None
+                if tracker_entry is not None:
+                    pending_tracker_entries.append((tracker_entry, liked_tracks_etag))
+                else:
+                    outcomes[outcome] += 1
+                if len(pending_tracker_entries) >= insert_batch_size:
+                    insert_tracker_entries(current_app, pending_tracker_entries, outcomes)
+                    pending_tracker_entries = []
+                progress_reporter.update(done=processed_count,
+                                         **get_tracker_progress(processed_count, total_users, outcomes))
+        if len(pending_tracker_entries) > 0:
+            insert_tracker_entries(current_app, pending_tracker_entries, outcomes)
+
+    current_app.logger.info(SUCCESSFUL_UPDATES_LOG.format(
+        tracker=TRACK_SHUFFLES_ATTRIBUTE_NAME, success_counter=outcomes[TRACKER_UPDATED],
+        total_enabled_users=total_users))
+    return get_tracker_result(total_users, outcomes)
+
+
+def get_tracker_result(total_users: int, outcomes: dict):
+    return {
+        "status": "success",
+        "message": "Finished updating trackers",
+        "updated_users": outcomes[TRACKER_UPDATED],
+        "total_enabled_users": total_users,
+        "outcomes": outcomes
+    }
+
+
+def get_tracker_progress(processed_count: int, total_users: int, outcomes: dict):
+    return {
+        "state": "Updated trackers for " + str(processed_count) + "/" + str(total_users) + " users...",
+        "processed": processed_count,
+        "total": total_users,
+        "outcomes": dict(outcomes)
+    }
+
+
+def insert_tracker_entries(current_app, pending_tracker_entries: list, outcomes: dict):
+    """
+    Insert a batch of tracker entries with one unordered insert_many and count the outcome of each
+    Entries that fail don't stop the rest of the batch from being inserted
+    New liked tracks ETags are only saved for users whose entry was inserted
+    """
+    tracker_entries = [tracker_entry for tracker_entry, _ in pending_tracker_entries]
+    failed_indexes = set()
+    try:
+        database.insert_liked_tracks_history_entries(tracker_entries)
+    except BulkWriteError as e:
+        failed_indexes = {write_error["index"] for write_error in e.details.get("writeErrors", [])}
+    except Exception as e:
+        current_app.logger.error("Error while adding new tracker entries: " + str(e))
+        failed_indexes = set(range(len(tracker_entries)))
+
+    liked_tracks_etags = {}
+    for index, (tracker_entry, liked_tracks_etag) in enumerate(pending_tracker_entries):
+        if index in failed_indexes:
+            tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                           tracker_entry[USER_ID_KEY], "Error while added new tracker entry", level="error")
+            outcomes[TRACKER_INSERT_FAILED] += 1
+        else:
+            tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                           tracker_entry[USER_ID_KEY], "Successfully added new tracker entry")
+            outcomes[TRACKER_UPDATED] += 1
+            if liked_tracks_etag is not None:
+                liked_tracks_etags[tracker_entry[USER_ID_KEY]] = liked_tracks_etag
+
+    if len(liked_tracks_etags) > 0:
+        try:
+            database.update_users_liked_tracks_etags(liked_tracks_etags)
+        except Exception as e:
+            current_app.logger.error("Error while saving liked tracks ETags: " + str(e))
+
+
+def get_user_tracker_entry_with_limit(app, limiter: TokenBucket, user, latest_counts: dict):
+    limiter.acquire()
+    with app.app_context():
+        return get_user_tracker_entry(current_app, user, latest_counts)
+
+
+def get_user_tracker_entry(current_app, user, latest_counts: dict):
+    """
+    Get the user's latest liked tracks count and the difference from their previous count
+    If the user's liked tracks ETag hasn't changed, the previous count is reused
+    Return the outcome, the new tracker entry (None if the user failed) and the ETag to save (None if unchanged)
+    """
+    if is_user_entry_valid(user) is False:
+        tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                       user[USER_ID_KEY] if USER_ID_KEY in user else "missing id",
+                       "Failed to update due to invalid user entry",
+                       level="error")
+        return TRACKER_INVALID_USER_ENTRY, None, None
+    auth_manager = create_auth_manager_with_token_dict(
+        current_app, user["spotify"])
+    # Refresh token only when near expiry, the auth manager holds whichever token is returned
+    if not token_utils.get_user_token_info(current_app, auth_manager, user):
+        tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                       user[USER_ID_KEY], "Failed to validate user token", level="error")
+        return TRACKER_INVALID_TOKEN, None, None
+    spotify = create_spotify_client_with_auth_manager(current_app, auth_manager)
+    previous_count = latest_counts.get(user[USER_ID_KEY])
+    # ETag is only useful when there is a previous count to reuse
+    previous_etag = user.get(LIKED_TRACKS_ETAG_KEY) if previous_count is not None else None
+    try:
+        liked_tracks_probe = util.probe_liked_tracks_count(spotify, previous_etag)
+    except Exception as e:
+        tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                       user[USER_ID_KEY], "Error while getting liked tracks count " + str(e), level="error")
+        return TRACKER_COUNT_FAILED, None, None
+    current_count = liked_tracks_probe["count"] if liked_tracks_probe["changed"] else previous_count
+    if current_count is None:
+        tracker_logger(current_app, USER_LIKED_TRACKS_TRACKER_LOG, TRACK_SHUFFLES_ATTRIBUTE_NAME,
+                       user[USER_ID_KEY], "Failed to get new liked tracks count", level="error")
+        return TRACKER_COUNT_FAILED, None, None
+
+    # For a new user, first entry difference will be 0
+    difference = 0
+    if previous_count is not None:
+        difference = current_count - previous_count
+
+    new_etag = None
+    if liked_tracks_probe["etag"] is not None and liked_tracks_probe["etag"] != user.get(LIKED_TRACKS_ETAG_KEY):
+        new_etag = liked_tracks_probe["etag"]
+
+    tracker_entry = {
+        USER_ID_KEY: user[USER_ID_KEY],
+        "count": current_count,
+        "difference": difference,
+        "created": datetime.datetime.today()
+    }
+    return TRACKER_UPDATED, tracker_entry, new_etag
+
+
+def is_user_entry_valid(user):
+    if (
+        USER_ID_KEY not in user or "user_attributes" not in user
+        or TRACKERS_ENABLED_ATTRIBUTE_NAME not in user["user_attributes"] or "spotify" not in user
+    ):
+        return False
+
+    # required values for spotipy to use refresh token
+    if "refresh_token" not in user["spotify"] or "expires_at" not in user["spotify"] or "scope" not in user["spotify"]:
+        return False
+
+    return True
+
+
+def tracker_logger(current_app, log_string, tracker_name, user_id, status_message, level="info"):
+    if level == "info":
+        current_app.logger.info(log_string.format(
+            tracker=tracker_name, user_id=user_id, status=status_message))
+    elif level == "error":
+        current_app.logger.error(log_string.format(
+            tracker=tracker_name, user_id=user_id, status=status_message))
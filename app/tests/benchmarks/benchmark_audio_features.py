@@ -0,0 +1,38 @@
+"""
+Compare per track audio feature aggregation with the matrix aggregation used by analysis
+
+    python -m tests.benchmarks.benchmark_audio_features
+"""
+import random
+import timeit
+
+from tests.functional.helpers.audio_features import (
+    FEATURE_NAMES, get_loop_audio_features, get_matrix_audio_features)
+
+TRACK_COUNTS = [1000, 10000, 50000]
+REPEAT = 5
+
+
+def create_audio_features(random_generator, track_count):
+    return [
+        dict({"id": "track" + str(index)},
+             **{feature_name: random_generator.random() for feature_name in FEATURE_NAMES})
+        for index in range(track_count)
+    ]
+
+
+def main():
+    random_generator = random.Random(0)
+    for track_count in TRACK_COUNTS:
+        all_audio_features = create_audio_features(random_generator, track_count)
+        assert get_matrix_audio_features(all_audio_features) == get_loop_audio_features(all_audio_features)
+        loop_seconds = min(timeit.repeat(lambda: get_loop_audio_features(all_audio_features), number=1, repeat=REPEAT))
+        matrix_seconds = min(timeit.repeat(lambda: get_matrix_audio_features(all_audio_features), number=1,
+                                           repeat=REPEAT))
+        print("{track_count} tracks: loop {loop:.1f} ms, matrix {matrix:.1f} ms, {speedup:.1f}x".format(
+            track_count=track_count, loop=loop_seconds * 1000, matrix=matrix_seconds * 1000,
+            speedup=loop_seconds / matrix_seconds))
+
+
+if __name__ == "__main__":
+    main()
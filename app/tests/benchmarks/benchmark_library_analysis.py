@@ -0,0 +1,174 @@
+"""
+Compare library analysis with the previous per track analysis
+
+    python -m tests.benchmarks.benchmark_library_analysis
+"""
+import json
+import timeit
+from datetime import datetime
+from flask import current_app
+
+from main import app
+from tasks import analysis_tasks
+from utils import util
+from tests.functional.helpers.library_tracks import create_track
+
+TRACK_COUNTS = [10000, 50000]
+REPEAT = 3
+
+
+class BenchmarkTask:
+    """
+    Serialises progress like the result backend, without sending it
+    """
+
+    def update_state(self, state, meta):
+        json.dumps({"status": state, "result": meta})
+
+
+def build_library_analysis_per_track(task, spotify, tracks):
+    """
+    Previous analysis, updating counts for each track as it is retrieved
+    Progress is sent through the same throttled reporter as the current analysis so only the analysis is compared
+    """
+    library_analysis = analysis_tasks.create_library_analysis()
+    most_common_artists = library_analysis["most_common_artists"]
+    most_common_albums = library_analysis["most_common_albums"]
+    most_common_genre = library_analysis["most_common_genre"]
+    release_year_counts = library_analysis["release_year_counts"]
+    longest_tracks_heap = library_analysis["longest_tracks_heap"]
+    shortest_tracks_heap = library_analysis["shortest_tracks_heap"]
+    total_length = 0
+
+    all_tracks_ids = []
+
+    num_tracks = 0
+    counter = 1
+    progress_reporter = util.create_task_progress_reporter(task)
+
+    # Fold each track into the counts as pages of the library are retrieved
+    for track in tracks:
+        track_data = track["track"]
+        all_tracks_ids.append(track_data["id"])
+        if num_tracks == 0:
+            library_analysis["watermark_added_at"] = track.get("added_at")
+        if track.get("added_at") == library_analysis["watermark_added_at"]:
+            library_analysis["watermark_track_ids"].append(track_data["id"])
+        duration_ms = int(track_data["duration_ms"])
+        analysis_tasks.push_bounded_heap(longest_tracks_heap, (duration_ms, -num_tracks, track), analysis_tasks.TOP_TRACKS_COUNT)
+        analysis_tasks.push_bounded_heap(shortest_tracks_heap, (-duration_ms, num_tracks, track), analysis_tasks.TOP_TRACKS_COUNT)
+        num_tracks += 1
+        # Most common artist
+        for artist in track_data["artists"]:
+            if artist["name"] in most_common_artists:
+                most_common_artists[artist["name"]]["count"] += 1
+            else:
+                artist_image_url = ""
+                if "images" in artist:
+                    artist_image_url = artist["images"][0]["url"]
+                most_common_artists[artist["name"]] = {
+                    "id": artist["id"],
+                    "name": artist["name"],
+                    "external_url": artist["external_urls"]["spotify"],
+                    "image": artist_image_url,
+                    "count": 1
+                }
+        # Most common album
+        album = track_data["album"]
+        if album["name"] in most_common_albums:
+            most_common_albums[album["name"]]["count"] += 1
+        else:
+            album_image_url = ""
+            if "images" in artist:
+                album_image_url = album["images"][0]["url"]
+            album_artist = ""
+            if "artists" in artist:
+                album_artist = album["artists"][0]["name"]
+            most_common_albums[album["name"]] = {
+                "id": album["id"],
+                "name": album["name"],
+                "artist": album_artist,
+                "external_url": album["external_urls"]["spotify"],
+                "image": album_image_url,
+                "count": 1
+            }
+        # Most common genre
+        if "genres" in album:
+            for genre in album["genres"]:
+                if genre in most_common_genre:
+                    most_common_genre[genre] += 1
+                else:
+                    most_common_genre[genre] = 1
+        # Average track length
+        total_length += int(track_data["duration_ms"])
+        # Release date
+        release_date = album["release_date"]
+
+        try:
+            release_date_object = datetime.strptime(release_date, '%Y-%m-%d').date()
+            if release_date_object.year in release_year_counts:
+                release_year_counts[release_date_object.year] += 1
+            else:
+                release_year_counts[release_date_object.year] = 1
+        except Exception as e:
+            try:
+                release_date_object = datetime.strptime(release_date, '%Y').date()
+                if release_date_object.year in release_year_counts:
+                    release_year_counts[release_date_object.year] += 1
+                else:
+                    release_year_counts[release_date_object.year] = 1
+            except Exception as e:
+                release_date_object = datetime.strptime(release_date, '%Y-%m').date()
+                if release_date_object.year in release_year_counts:
+                    release_year_counts[release_date_object.year] += 1
+                else:
+                    release_year_counts[release_date_object.year] = 1
+        progress_reporter.update("Analysed " + str(counter) + " tracks so far...")
+        counter = counter + 1
+    progress_reporter.flush()
+
+    library_analysis["num_tracks"] = num_tracks
+    library_analysis["total_length"] = total_length
+    if num_tracks > 0:
+        try:
+            library_analysis["audio_features"] = analysis_tasks.sum_audio_features(task, spotify, all_tracks_ids)
+        except Exception as e:
+            current_app.logger.error("Failed while retrieving/calculating audio features: " + str(e))
+            raise Exception(
+                "Failed while retrieving/calculating audio features: " + str(e))
+    return library_analysis
+
+
+def create_library(track_count):
+    tracks = []
+    for index in range(track_count):
+        track = create_track(index % 5000, "2024-01-01T00:00:00Z", duration_ms=100000 + (index * 7919) % 200000)
+        track["track"]["artists"][0]["name"] = "artist" + str(index % 2000)
+        track["track"]["album"]["name"] = "album" + str(index % 3000)
+        track["track"]["album"]["release_date"] = str(1960 + index % 60) + ["-03-26", "", "-01"][index % 3]
+        tracks.append(track)
+    return tracks
+
+
+def main():
+    # Audio features are benchmarked separately in benchmark_audio_features
+    analysis_tasks.sum_audio_features = lambda task, spotify, tracks_ids: analysis_tasks.create_audio_feature_scores()
+    with app.app_context():
+        for track_count in TRACK_COUNTS:
+            tracks = create_library(track_count)
+            assert analysis_tasks.get_library_analysis_response(
+                build_library_analysis_per_track(BenchmarkTask(), None, tracks)) == \
+                analysis_tasks.get_library_analysis_response(
+                    analysis_tasks.build_library_analysis(BenchmarkTask(), None, tracks))
+            per_track_seconds = min(timeit.repeat(
+                lambda: build_library_analysis_per_track(BenchmarkTask(), None, tracks), number=1, repeat=REPEAT))
+            columns_seconds = min(timeit.repeat(
+                lambda: analysis_tasks.build_library_analysis(BenchmarkTask(), None, tracks), number=1,
+                repeat=REPEAT))
+            print("{track_count} tracks: per track {per_track:.0f} ms, columns {columns:.0f} ms, {speedup:.1f}x".format(
+                track_count=track_count, per_track=per_track_seconds * 1000, columns=columns_seconds * 1000,
+                speedup=per_track_seconds / columns_seconds))
+
+
+if __name__ == "__main__":
+    main()
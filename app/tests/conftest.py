@@ -0,0 +1,12 @@
+import pytest
+
+from utils import auth_utils, util
+
+
+@pytest.fixture(autouse=True)
+def clear_in_process_caches():
+    """Stops cached values leaking between tests
+    """
+    util._user_profile_cache.clear()
+    auth_utils._session_cache.clear()
+    yield
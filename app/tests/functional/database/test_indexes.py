@@ -0,0 +1,113 @@
+import inspect
+import logging
+from unittest.mock import MagicMock
+
+from database import database, indexes
+
+logger = logging.getLogger("test")
+
+COLLSCAN_EXPLANATION = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "SORT",
+            "inputStage": {"stage": "COLLSCAN", "direction": "forward"}
+        }
+    }
+}
+
+IXSCAN_EXPLANATION = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "user_id_id"}
+        }
+    }
+}
+
+
+def test_every_query_has_index_success():
+    for name, collection_name, query_filter, sort in indexes.get_queries():
+        index_keys = [list(index_model.document["key"].keys()) for index_model in indexes.INDEXES[collection_name]]
+        # _id always has an index
+        assert "_id" in query_filter or any(keys[0] in query_filter for keys in index_keys), name
+
+
+def test_every_database_function_has_query_arguments_success():
+    database_functions = [
+        name for name, function in inspect.getmembers(database, inspect.isfunction)
+        if function.__module__ == database.__name__
+    ]
+
+    assert len(database_functions) > 0
+    assert sorted(database_functions) == sorted(indexes.QUERY_ARGUMENTS)
+
+
+def test_get_queries_records_database_filters_success():
+    database_mongo = database.mongo
+
+    queries = indexes.get_queries()
+
+    assert database.mongo is database_mongo
+    assert ("find_users_latest_liked_tracks_counts", "liked_tracks_history",
+            {"user_id": {"$in": [""]}}, [("user_id", -1), ("_id", -1)]) in queries
+    assert ("update_users_liked_tracks_etags", "users", {"user_id": ""}, None) in queries
+    assert ("find_expired_session_ids", "sessions",
+            {"session_expiry": {"$lt": indexes.QUERY_ARGUMENTS["find_expired_session_ids"][0]}}, None) in queries
+    # Inserts have no filter
+    assert "insert_liked_tracks_history_entry" not in [name for name, _, _, _ in queries]
+
+
+def test_ensure_indexes_success():
+    db = MagicMock()
+
+    failed_collections = indexes.ensure_indexes(db, logger)
+
+    assert failed_collections == []
+    for collection_name, index_models in indexes.INDEXES.items():
+        db[collection_name].create_indexes.assert_any_call(index_models)
+
+
+def test_ensure_indexes_continues_after_failure():
+    db = MagicMock()
+    collections = {}
+
+    def get_collection(collection_name):
+        collection = collections.setdefault(collection_name, MagicMock())
+        if collection_name == "users":
+            collection.create_indexes.side_effect = Exception("duplicate key")
+        return collection
+    db.__getitem__.side_effect = get_collection
+
+    failed_collections = indexes.ensure_indexes(db, logger)
+
+    assert failed_collections == ["users"]
+    assert collections["sessions"].create_indexes.call_count == 1
+
+
+def test_get_plan_stages_nested_success():
+    plan = {
+        "stage": "OR",
+        "inputStages": [
+            {"stage": "IXSCAN"},
+            {"stage": "FETCH", "inputStage": {"stage": "COLLSCAN"}}
+        ]
+    }
+
+    assert sorted(indexes.get_plan_stages(plan)) == ["COLLSCAN", "FETCH", "IXSCAN", "OR"]
+
+
+def test_find_collection_scans_success():
+    db = MagicMock()
+
+    def get_collection(collection_name):
+        collection = MagicMock()
+        explanation = COLLSCAN_EXPLANATION if collection_name == "users" else IXSCAN_EXPLANATION
+        collection.find.return_value.explain.return_value = explanation
+        return collection
+    db.__getitem__.side_effect = get_collection
+
+    collection_scans = indexes.find_collection_scans(db)
+
+    assert collection_scans == [
+        name for name, collection_name, _, _ in indexes.get_queries() if collection_name == "users"]
+    assert "update_users_liked_tracks_etags" in collection_scans
@@ -0,0 +1,36 @@
+from tasks.analysis_tasks import create_audio_feature_scores, get_average_audio_features
+from utils import audio_feature_matrix_utils
+
+FEATURE_NAMES = [feature_scores.feature_name for feature_scores in create_audio_feature_scores()]
+
+
+def get_loop_audio_features(all_audio_features):
+    """
+    Reference per track aggregation, as analysis did before the matrix aggregation
+    """
+    audio_feature_scores = create_audio_feature_scores()
+    for track in all_audio_features:
+        if track is None:
+            continue
+        for feature_scores in audio_feature_scores:
+            feature_name = feature_scores.feature_name
+            if feature_name not in track or track[feature_name] is None:
+                continue
+            feature_scores.total_score += track[feature_name]
+            if feature_scores.highest_feature_score["id"] == "" \
+                    or track[feature_name] > feature_scores.highest_feature_score["value"]:
+                feature_scores.highest_feature_score = {"id": track["id"], "value": track[feature_name]}
+            if feature_scores.lowest_feature_score["id"] == "" \
+                    or track[feature_name] < feature_scores.lowest_feature_score["value"]:
+                feature_scores.lowest_feature_score = {"id": track["id"], "value": track[feature_name]}
+    return get_average_audio_features(audio_feature_scores, len(all_audio_features))
+
+
+def get_matrix_audio_features(all_audio_features):
+    audio_feature_scores = create_audio_feature_scores()
+    for feature_scores, feature_summary in zip(
+            audio_feature_scores, audio_feature_matrix_utils.summarise_audio_features(all_audio_features, FEATURE_NAMES)):
+        feature_scores.total_score = feature_summary["total_score"]
+        feature_scores.highest_feature_score = feature_summary["highest_feature_score"]
+        feature_scores.lowest_feature_score = feature_summary["lowest_feature_score"]
+    return get_average_audio_features(audio_feature_scores, len(all_audio_features))
@@ -0,0 +1,25 @@
+def create_track(index, added_at, duration_ms=None):
+    return {
+        "added_at": added_at,
+        "track": {
+            "id": "track" + str(index),
+            "name": "track" + str(index),
+            "duration_ms": duration_ms if duration_ms is not None else 100000 + (index % 3) * 1000,
+            "external_urls": {"spotify": "https://open.spotify.com/track/" + str(index)},
+            "preview_url": None,
+            "artists": [{
+                "id": "artist" + str(index % 2),
+                "name": "artist" + str(index % 2),
+                "external_urls": {"spotify": "https://open.spotify.com/artist/" + str(index % 2)}
+            }],
+            "album": {
+                "id": "album" + str(index % 3),
+                "name": "album" + str(index % 3),
+                "artists": [{"name": "artist" + str(index % 2)}],
+                "external_urls": {"spotify": "https://open.spotify.com/album/" + str(index % 3)},
+                "images": [{"url": "large"}, {"url": "medium"}],
+                "genres": ["genre" + str(index % 2)],
+                "release_date": ["2019-03-26", "2001", "1999-01"][index % 3]
+            }
+        }
+    }
@@ -177,3 +177,101 @@ def test_session_database_connection_error_failure(mocker, client, env_patch):
 
     response = client.get('/api/playlist/me')
     assert response.status_code == 400
+
+
+def test_session_cached_between_requests_success(mocker, client, env_patch):
+    """
+    Successful GET Playlists twice - Session entry is only read from database once
+    """
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value={
+                            "access_token": "accesstokenfromspotify",
+                            "refresh_token": "refreshtokenfromspotify"
+                        }
+                        )
+    mocker.patch.object(Spotify, "current_user_playlists",
+                        return_value=mock_user_playlists_sample
+                        )
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    session_entry = {
+        "user_id": "user_id",
+        "access_token": "access_token",
+        "refresh_token": "refresh_token",
+        "expires_at": "expires_at",
+        "scope": "scope",
+        "session_expiry": test_expiry
+    }
+    mock_find_session = mocker.patch.object(database, "find_session", return_value=session_entry)
+    mocker.patch.object(database, "find_and_update_session", return_value=session_entry)
+    mocker.patch.object(database, "delete_session", return_value=None)
+    # Init cookies
+    client.set_cookie('localhost', 'trueshuffle-sessionId', 'sessionId')
+    client.set_cookie('localhost', 'trueshuffle-auth', 'true')
+
+    assert client.get('/api/playlist/me').status_code == 200
+    assert client.get('/api/playlist/me').status_code == 200
+    assert mock_find_session.call_count == 1
+
+    # Logout removes cached session
+    client.post('/api/spotify/auth/logout')
+    client.set_cookie('localhost', 'trueshuffle-sessionId', 'sessionId')
+    mock_find_session.return_value = None
+
+    assert client.get('/api/playlist/me').status_code == 401
+    assert mock_find_session.call_count == 2
+
+
+def test_session_expiry_write_skipped_when_recently_extended_success(mocker, client, env_patch):
+    """
+    Successful GET Playlists - Session expiry not written while stored expiry is above refresh threshold
+    """
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
+    mocker.patch.object(Spotify, "current_user_playlists", return_value=mock_user_playlists_sample)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch.object(database, "find_session",
+                        return_value={
+                            "user_id": "user_id",
+                            "access_token": "access_token",
+                            "refresh_token": "refresh_token",
+                            "expires_at": "expires_at",
+                            "scope": "scope",
+                            "session_expiry": datetime.now(timezone.utc) + timedelta(hours=3, minutes=55)
+                        }
+                        )
+    mock_update_session = mocker.patch.object(database, "find_and_update_session", return_value=None)
+    # Init cookies
+    client.set_cookie('localhost', 'trueshuffle-sessionId', 'sessionId')
+    client.set_cookie('localhost', 'trueshuffle-auth', 'true')
+
+    response = client.get('/api/playlist/me')
+
+    assert response.status_code == 200
+    mock_update_session.assert_not_called()
+    assert "trueshuffle-sessionId=sessionId" in response.headers.getlist("Set-Cookie")[0]
+
+
+def test_session_expiry_written_below_refresh_threshold_success(mocker, client, env_patch):
+    """
+    Successful GET Playlists - Session expiry written once stored expiry falls below refresh threshold
+    """
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
+    mocker.patch.object(Spotify, "current_user_playlists", return_value=mock_user_playlists_sample)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch.object(database, "find_session",
+                        return_value={
+                            "user_id": "user_id",
+                            "access_token": "access_token",
+                            "refresh_token": "refresh_token",
+                            "expires_at": "expires_at",
+                            "scope": "scope",
+                            "session_expiry": datetime.now(timezone.utc) + timedelta(hours=1)
+                        }
+                        )
+    mock_update_session = mocker.patch.object(database, "find_and_update_session", return_value=None)
+    # Init cookies
+    client.set_cookie('localhost', 'trueshuffle-sessionId', 'sessionId')
+    client.set_cookie('localhost', 'trueshuffle-auth', 'true')
+
+    response = client.get('/api/playlist/me')
+
+    assert response.status_code == 200
+    mock_update_session.assert_called_once()
@@ -0,0 +1,43 @@
+from tests import env_patch  # noqa: F401
+
+from main import app
+from database import database
+from services.session_service import handle_clean_up_expired_sesions
+
+
+class MockDeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+def test_clean_up_expired_sessions_in_batches_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch.dict(app.config, {"SESSION_CLEANUP_BATCH_SIZE": 2, "SESSION_CLEANUP_MAX_BATCHES": 10})
+        mock_find = mocker.patch.object(database, "find_expired_session_ids",
+                                        side_effect=[["id0", "id1"], ["id2", "id3"], ["id4"]])
+        mock_delete = mocker.patch.object(database, "delete_sessions_by_ids",
+                                          side_effect=lambda ids: MockDeleteResult(len(ids)))
+
+        response = handle_clean_up_expired_sesions(app)
+
+        assert response == {
+            "status": "success",
+            "deleted_count": "5",
+            "batches": 3,
+            "complete": True
+        }
+        assert mock_find.call_count == 3
+        mock_delete.assert_called_with(["id4"])
+
+
+def test_clean_up_expired_sessions_stops_at_max_batches_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch.dict(app.config, {"SESSION_CLEANUP_BATCH_SIZE": 2, "SESSION_CLEANUP_MAX_BATCHES": 2})
+        mocker.patch.object(database, "find_expired_session_ids", return_value=["id0", "id1"])
+        mocker.patch.object(database, "delete_sessions_by_ids", return_value=MockDeleteResult(2))
+
+        response = handle_clean_up_expired_sesions(app)
+
+        assert response["deleted_count"] == "4"
+        assert response["batches"] == 2
+        assert response["complete"] is False
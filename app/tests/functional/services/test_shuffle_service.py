@@ -194,9 +194,7 @@ def test_queue_shuffle_playlist_cookies_missing_failure(mocker, client, env_patc
 
 def test_delete_shuffled_playlists_success(mocker, client, env_patch):
     mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
-    mocker.patch.object(Spotify, "current_user_playlists", return_value=all_user_playlists_response_sample)
-    mocker.patch.object(Spotify, "current_user_unfollow_playlist", return_value=True)
-    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch("tasks.playlist_tasks.delete_all_shuffled_playlists.delay", return_value=MockAsyncResult(id="test_id"))
 
     mocker.patch.object(database, "find_session",
                         return_value={
@@ -227,8 +225,7 @@ def test_delete_shuffled_playlists_success(mocker, client, env_patch):
 
     assert response.status_code == 200
     assert response_json == {
-        "status": "success",
-        "deleted_playlists_count": 1
+        "delete_task_id": "test_id"
     }
 
 
@@ -0,0 +1,188 @@
+from tests import env_patch  # noqa: F401
+
+import requests
+from spotipy import Spotify
+
+from main import app
+from services import spotify_client
+from services.spotify_client import create_spotify_client, get_shared_session, SharedSession
+from tests.functional.helpers.mock_requests import spotify_auth_sample
+from utils import util
+
+
+def test_spotify_clients_share_session_success(env_patch):  # noqa: F811
+    with app.app_context():
+        first_client = create_spotify_client(app, spotify_auth_sample)
+        second_client = create_spotify_client(app, dict(spotify_auth_sample, access_token="other access token"))
+
+        assert first_client._session is second_client._session
+        assert first_client.auth_manager._session is first_client._session
+        # Token state stays with each client's auth manager
+        assert first_client.auth_manager.cache_handler is not second_client.auth_manager.cache_handler
+
+
+def test_shared_session_not_closed_by_client_success(env_patch):  # noqa: F811
+    with app.app_context():
+        session = get_shared_session(app)
+        adapter = session.get_adapter("https://api.spotify.com")
+        client = create_spotify_client(app, spotify_auth_sample)
+        del client
+
+        assert get_shared_session(app) is session
+        assert session.get_adapter("https://api.spotify.com") is adapter
+
+
+def test_shared_session_retries_like_spotipy_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch.object(spotify_client.os, "getpid", return_value=-2)
+        retry = get_shared_session(app).get_adapter("https://api.spotify.com").max_retries
+        spotipy_retry = Spotify()._session.get_adapter("https://api.spotify.com").max_retries
+
+        assert set(retry.status_forcelist) == {429, 500, 502, 503, 504}
+        assert set(retry.status_forcelist) == set(spotipy_retry.status_forcelist)
+        assert retry.respect_retry_after_header is True
+        assert retry.total == spotipy_retry.total
+        assert retry.status == spotipy_retry.status
+        assert retry.allowed_methods == spotipy_retry.allowed_methods
+
+
+def test_shared_session_recreated_after_fork_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        session = get_shared_session(app)
+        mocker.patch.object(spotify_client.os, "getpid", return_value=-1)
+
+        assert get_shared_session(app) is not session
+
+
+class MockResponseCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def set(self, url, etag, headers, content, ttl=None):
+        self.entries[url] = {"etag": etag, "headers": headers, "content": content, "ttl": ttl}
+
+
+def create_mock_response(status_code, content=b"", etag=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    if etag is not None:
+        response.headers["ETag"] = etag
+    response.headers["Content-Type"] = "application/json"
+    response.url = "https://api.spotify.com/v1/playlists/playlist0/tracks?limit=100"
+    return response
+
+
+def test_shared_session_serves_not_modified_from_cache_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = MockResponseCache()
+    mock_request = mocker.patch.object(requests.Session, "request", side_effect=[
+        create_mock_response(200, b'{"total": 1}', etag='"etag0"'),
+        create_mock_response(304)
+    ])
+
+    with app.app_context():
+        first_response = session.request("GET", "https://api.spotify.com/v1/playlists/playlist0/tracks",
+                                         params={"limit": 100}, headers={"Authorization": "Bearer token0"})
+        second_response = session.request("GET", "https://api.spotify.com/v1/playlists/playlist0/tracks",
+                                          params={"limit": 100}, headers={"Authorization": "Bearer token1"})
+
+    assert first_response.json() == {"total": 1}
+    assert "If-None-Match" not in mock_request.call_args_list[0][1]["headers"]
+    assert mock_request.call_args_list[1][1]["headers"]["If-None-Match"] == '"etag0"'
+    assert mock_request.call_args_list[1][1]["headers"]["Authorization"] == "Bearer token1"
+    assert second_response.status_code == 200
+    assert second_response.json() == {"total": 1}
+
+
+def test_shared_session_cache_skips_caller_conditional_and_writes_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = MockResponseCache()
+    mock_request = mocker.patch.object(requests.Session, "request", side_effect=[
+        create_mock_response(304),
+        create_mock_response(200, b'{}', etag='"etag0"')
+    ])
+
+    with app.app_context():
+        # Caller's own conditional request is passed through
+        response = session.request("GET", "https://api.spotify.com/v1/me/tracks", headers={"If-None-Match": "etag"})
+        # Writes are never cached
+        session.request("PUT", "https://api.spotify.com/v1/playlists/playlist0/tracks", headers={})
+
+    assert response.status_code == 304
+    assert mock_request.call_count == 2
+    assert session.response_cache.entries == {}
+
+
+def test_shared_session_cache_error_falls_back_to_request_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = mocker.Mock()
+    session.response_cache.get.side_effect = Exception("Redis unavailable")
+    session.response_cache.set.side_effect = Exception("Redis unavailable")
+    mocker.patch.object(requests.Session, "request",
+                        return_value=create_mock_response(200, b'{"total": 1}', etag='"etag0"'))
+
+    with app.app_context():
+        response = session.request("GET", "https://api.spotify.com/v1/playlists/playlist0/tracks", headers={})
+
+    assert response.json() == {"total": 1}
+
+
+def test_shared_session_cache_error_in_worker_threads_falls_back_to_request_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = mocker.Mock()
+    session.response_cache.get.side_effect = Exception("Redis unavailable")
+    session.response_cache.set.side_effect = Exception("Redis unavailable")
+    mocker.patch.object(requests.Session, "request", side_effect=lambda method, url, **kwargs: create_mock_response(
+        200, ('{"total": 300, "items": [{"offset": ' + str(kwargs["params"]["offset"]) + '}]}').encode(),
+        etag='"etag0"'))
+    spotify = Spotify(auth="token", requests_session=session)
+
+    # Pages after the first are retrieved in threads without an app context
+    pages = list(util.iterate_playlist_pages(spotify, "playlist0", max_workers=2))
+
+    assert [page["items"][0]["offset"] for page in pages] == [0, 1, 101, 201]
+    assert session.response_cache.get.call_count == 4
+
+
+def test_shared_session_cache_current_user_urls_per_token_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = MockResponseCache()
+    session.current_user_response_cache_ttl = 3600
+    mock_request = mocker.patch.object(requests.Session, "request", side_effect=[
+        create_mock_response(200, b'{"total": 1}', etag='"etag0"'),
+        create_mock_response(200, b'{"total": 2}', etag='"etag1"'),
+        create_mock_response(304)
+    ])
+
+    with app.app_context():
+        for token in ["Bearer token0", "Bearer token1", "Bearer token0"]:
+            response = session.request("GET", "https://api.spotify.com/v1/me/playlists", params={"limit": 1},
+                                       headers={"Authorization": token})
+
+    # Each user's response is kept, rather than overwriting the previous user's
+    assert "If-None-Match" not in mock_request.call_args_list[1][1]["headers"]
+    assert mock_request.call_args_list[2][1]["headers"]["If-None-Match"] == '"etag0"'
+    assert response.json() == {"total": 1}
+    assert len(session.response_cache.entries) == 2
+    assert [entry["ttl"] for entry in session.response_cache.entries.values()] == [3600, 3600]
+
+
+def test_shared_session_cache_skips_liked_tracks_and_disabled_current_user_success(mocker, env_patch):  # noqa: F811
+    session = SharedSession()
+    session.response_cache = MockResponseCache()
+    mock_request = mocker.patch.object(requests.Session, "request",
+                                       return_value=create_mock_response(200, b'{}', etag='"etag0"'))
+
+    with app.app_context():
+        session.request("GET", "https://api.spotify.com/v1/me/tracks", params={"offset": 50}, headers={})
+        session.current_user_response_cache_ttl = 0
+        session.request("GET", "https://api.spotify.com/v1/me/playlists", headers={})
+        session.request("GET", "https://api.spotify.com/v1/playlists/playlist0/tracks", headers={})
+
+    assert mock_request.call_count == 3
+    assert list(session.response_cache.entries.values()) == [
+        {"etag": '"etag0"', "headers": {"Content-Type": "application/json"}, "content": b'{}', "ttl": None}]
@@ -0,0 +1,170 @@
+from tests import env_patch # noqa: F401
+
+from spotipy import Spotify
+from database import database
+from main import app
+from utils import util, audio_features_cache_utils
+
+from tasks import analysis_tasks
+from tests.functional.helpers.library_tracks import create_track
+
+
+def create_audio_features(track_id):
+    index = int(track_id[len("track"):])
+    audio_features = {"id": track_id}
+    for feature_name in ["acousticness", "danceability", "energy", "instrumentalness", "liveness", "loudness",
+                         "speechiness", "tempo", "valence"]:
+        audio_features[feature_name] = (index % 4) / 4
+    return audio_features
+
+
+# Newest first, two tracks share the newest added_at
+all_tracks = [
+    create_track(5, "2024-01-03T00:00:00Z"),
+    create_track(4, "2024-01-03T00:00:00Z"),
+    create_track(3, "2024-01-02T00:00:00Z", duration_ms=300000),
+    create_track(2, "2024-01-01T00:00:00Z"),
+    create_track(1, "2024-01-01T00:00:00Z", duration_ms=300000),
+    create_track(0, "2023-12-31T00:00:00Z"),
+]
+
+
+def mock_analysis_requests(mocker, tracks_pages):
+    mocker.patch.object(util, "update_task_progress", return_value=None)
+    mock_iterate = mocker.patch.object(util, "iterate_playlist_items",
+                                       side_effect=[iter(tracks) for tracks in tracks_pages])
+    mock_audio_features = mocker.patch.object(
+        audio_features_cache_utils, "get_all_track_audio_features_with_cache",
+        side_effect=lambda task, spotify, track_ids: [create_audio_features(track_id) for track_id in track_ids])
+    return mock_iterate, mock_audio_features
+
+
+def get_stored_entry(tracks):
+    with app.app_context():
+        return analysis_tasks.serialize_library_analysis(
+            analysis_tasks.build_library_analysis(None, Spotify(), tracks))
+
+
+def test_get_user_analysis_full_build_saved_success(mocker, env_patch):
+    mock_analysis_requests(mocker, [all_tracks])
+    mocker.patch.object(database, "find_library_analysis", return_value=None)
+    mock_save = mocker.patch.object(database, "find_and_update_library_analysis", return_value=None)
+
+    with app.app_context():
+        response = analysis_tasks.get_user_analysis(None, app, Spotify(), "user_id")
+
+    assert response["num_tracks"] == 6
+    assert response["num_artists"] == 2
+    assert response["longest_tracks"][0]["title"] == "track3"
+    saved_entry = mock_save.call_args[0][1]
+    assert saved_entry["version"] == analysis_tasks.LIBRARY_ANALYSIS_VERSION
+    assert saved_entry["watermark_added_at"] == "2024-01-03T00:00:00Z"
+    assert saved_entry["watermark_track_ids"] == ["track5", "track4"]
+    assert [2019, 2] in saved_entry["release_year_counts"]
+
+
+def test_get_user_analysis_merges_new_tracks_success(mocker, env_patch):
+    mock_iterate, mock_audio_features = mock_analysis_requests(mocker, [all_tracks, all_tracks])
+    # Stored analysis has the older tracks, including one of the tracks at the newest added_at
+    stored_entry = get_stored_entry(all_tracks[1:])
+    mock_audio_features.reset_mock()
+    mocker.patch.object(Spotify, "current_user_saved_tracks",
+                        return_value={"total": 6, "items": all_tracks[:1]})
+    mocker.patch.object(database, "find_library_analysis", return_value=stored_entry)
+    mock_save = mocker.patch.object(database, "find_and_update_library_analysis", return_value=None)
+
+    with app.app_context():
+        merged_response = analysis_tasks.get_user_analysis(None, app, Spotify(), "user_id")
+        full_response = analysis_tasks.get_user_analysis(None, app, Spotify())
+
+    assert merged_response == full_response
+    # Only the newly liked track's audio features are retrieved
+    assert mock_audio_features.call_args_list[0][0][2] == ["track5"]
+    assert mock_save.call_args[0][1]["watermark_track_ids"] == ["track5", "track4"]
+    assert mock_save.call_args[0][1]["num_tracks"] == 6
+
+
+def test_get_user_analysis_unchanged_not_saved_success(mocker, env_patch):
+    mock_iterate, mock_audio_features = mock_analysis_requests(mocker, [])
+    stored_entry = get_stored_entry(all_tracks)
+    mock_audio_features.reset_mock()
+    mocker.patch.object(Spotify, "current_user_saved_tracks",
+                        return_value={"total": 6, "items": all_tracks[:1]})
+    mocker.patch.object(database, "find_library_analysis", return_value=stored_entry)
+    mock_save = mocker.patch.object(database, "find_and_update_library_analysis", return_value=None)
+
+    with app.app_context():
+        response = analysis_tasks.get_user_analysis(None, app, Spotify(), "user_id")
+
+    assert response["num_tracks"] == 6
+    assert mock_iterate.call_count == 0
+    assert mock_audio_features.call_count == 0
+    assert mock_save.call_count == 0
+
+
+def test_get_user_analysis_removed_tracks_rebuild_success(mocker, env_patch):
+    mock_iterate, mock_audio_features = mock_analysis_requests(mocker, [all_tracks, all_tracks])
+    # Stored analysis includes a track which has since been removed
+    stored_entry = get_stored_entry(all_tracks[1:] + [create_track(9, "2023-01-01T00:00:00Z")])
+    mock_audio_features.reset_mock()
+    mocker.patch.object(Spotify, "current_user_saved_tracks",
+                        return_value={"total": 6, "items": all_tracks[:1]})
+    mocker.patch.object(database, "find_library_analysis", return_value=stored_entry)
+    mock_save = mocker.patch.object(database, "find_and_update_library_analysis", return_value=None)
+
+    with app.app_context():
+        response = analysis_tasks.get_user_analysis(None, app, Spotify(), "user_id")
+
+    assert response["num_tracks"] == 6
+    assert mock_iterate.call_count == 2
+    assert mock_audio_features.call_args[0][2] == [track["track"]["id"] for track in all_tracks]
+    assert mock_save.call_args[0][1]["num_tracks"] == 6
+
+
+def test_get_release_year_success():
+    assert analysis_tasks.get_release_year("2019-03-26") == 2019
+    assert analysis_tasks.get_release_year("2001") == 2001
+    assert analysis_tasks.get_release_year("1999-01") == 1999
+
+
+def test_get_release_year_invalid_failure():
+    assert analysis_tasks.get_release_year("0000") is None
+    assert analysis_tasks.get_release_year("") is None
+    assert analysis_tasks.get_release_year(None) is None
+    assert analysis_tasks.get_release_year("20190326") is None
+    assert analysis_tasks.get_release_year("unknown") is None
+
+
+def test_build_library_analysis_top_tracks_success(mocker, env_patch):
+    mock_analysis_requests(mocker, [])
+    tracks = [create_track(index, "2024-01-01T00:00:00Z", duration_ms=100000 + (index % 4) * 1000)
+              for index in range(30)]
+
+    with app.app_context():
+        response = analysis_tasks.get_library_analysis_response(
+            analysis_tasks.build_library_analysis(None, Spotify(), tracks))
+
+    # Same tracks as the first/last 10 of a stable descending sort on duration, in library order within a duration
+    assert [track["title"] for track in response["longest_tracks"]] == [
+        "track" + str(index) for index in [3, 7, 11, 15, 19, 23, 27, 2, 6, 10]]
+    assert [track["title"] for track in response["shortest_tracks"]] == [
+        "track" + str(index) for index in [0, 4, 8, 12, 16, 20, 24, 28, 25, 29]]
+    assert response["release_year_counts"] == {2019: 10, 2001: 10, 1999: 10}
+    assert response["most_common_albums"][0] == {
+        "id": "album0", "name": "album0", "artist": "", "external_url": "https://open.spotify.com/album/0",
+        "image": "", "count": 10}
+
+
+def test_build_library_analysis_equal_length_tracks_success(mocker, env_patch):
+    mock_analysis_requests(mocker, [])
+    tracks = [create_track(index, "2024-01-01T00:00:00Z", duration_ms=100000) for index in range(12)]
+    sorted_tracks = sorted(tracks, key=lambda track: int(track["track"]["duration_ms"]), reverse=True)
+
+    with app.app_context():
+        response = analysis_tasks.get_library_analysis_response(
+            analysis_tasks.build_library_analysis(None, Spotify(), tracks))
+
+    assert [track["title"] for track in response["longest_tracks"]] == [
+        track["track"]["name"] for track in sorted_tracks[:10]]
+    assert [track["title"] for track in response["shortest_tracks"]] == [
+        track["track"]["name"] for track in sorted_tracks[2:]]
@@ -5,7 +5,7 @@ from database import database
 
 from tests.functional.helpers.mock_requests import *
 from tests.functional.helpers.mock_responses import *
-from tasks.playlist_tasks import shuffle_playlist, create_playlist_from_liked_tracks
+from tasks.playlist_tasks import shuffle_playlist, create_playlist_from_liked_tracks, delete_all_shuffled_playlists
 
 SHUFFLED_PLAYLIST_PREFIX = "[Shuffled] "
 LIKED_TRACKS_PLAYLIST_ID = "likedTracks"
@@ -104,7 +104,81 @@ def test_shuffle_playlist_shuffled_playlist_exists_success(mocker, env_patch):
     assert response["num_of_tracks"] == 2
     assert response["creation_time"] is not None
 
-    
+
+
+def test_shuffle_playlist_reuse_existing_shuffled_playlist_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch("utils.tracker_utils.update_user_trackers", return_value=None)
+    mocker.patch("utils.tracker_utils.update_overall_trackers", return_value=None)
+    mocker.patch.object(Spotify, "playlist_items", side_effect=[mock_tracks_response, empty_all_user_playlists_response_sample])
+    mocker.patch.object(Spotify, "current_user_playlists", return_value=all_user_playlists_response_sample)
+    mock_unfollow = mocker.patch.object(Spotify, "current_user_unfollow_playlist", return_value=True)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mock_create = mocker.patch.object(Spotify, "user_playlist_create", return_value=create_user_playlist_response)
+    mock_replace = mocker.patch.object(Spotify, "playlist_replace_items", return_value=playlist_add_items_response)
+    mock_add_items = mocker.patch.object(Spotify, "playlist_add_items", return_value=playlist_add_items_response)
+    mocker.patch.object(database, "find_user",
+        return_value={
+            "user_id": "user_id",
+            "user_attributes": {
+                "trackers_enabled": True
+            }
+        }
+    )
+
+    response = shuffle_playlist(spotify_auth_sample, "playlist_id", "playlist1", False)
+
+    assert response["status"] == "success"
+    assert response["num_of_tracks"] == 2
+    mock_replace.assert_called_once()
+    assert mock_replace.call_args[0][0] == "playlist1"
+    mock_add_items.assert_not_called()
+    mock_create.assert_not_called()
+    mock_unfollow.assert_not_called()
+
+
+def test_shuffle_playlist_existing_shuffled_playlist_found_in_index_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch("utils.tracker_utils.update_user_trackers", return_value=None)
+    mocker.patch("utils.tracker_utils.update_overall_trackers", return_value=None)
+    mocker.patch.object(Spotify, "playlist_items", side_effect=[mock_tracks_response, empty_all_user_playlists_response_sample])
+    mock_user_playlists = mocker.patch.object(Spotify, "current_user_playlists", return_value=all_user_playlists_response_sample)
+    mocker.patch.object(Spotify, "playlist_is_following", return_value=[True])
+    mock_unfollow = mocker.patch.object(Spotify, "current_user_unfollow_playlist", return_value=True)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch.object(Spotify, "user_playlist_create", return_value=create_user_playlist_response)
+    mocker.patch.object(Spotify, "playlist_add_items", return_value=playlist_add_items_response)
+    mocker.patch.object(database, "find_user",
+        return_value={
+            "user_id": "user_id",
+            "user_attributes": {
+                "trackers_enabled": True
+            }
+        }
+    )
+    mocker.patch.object(database, "find_shuffled_playlist",
+        return_value={
+            "user_id": "user_id",
+            "playlist_id": "playlist_id",
+            "shuffled_playlist_id": "old_shuffled_playlist_id",
+            "shuffled_playlist_uri": SPOTIFY_PLAYLIST_URL
+        }
+    )
+    mock_update_index = mocker.patch.object(database, "find_and_update_shuffled_playlist", return_value=None)
+
+    response = shuffle_playlist(spotify_auth_sample, "playlist_id", "playlist_name")
+
+    assert response["status"] == "success"
+    mock_user_playlists.assert_not_called()
+    mock_unfollow.assert_called_once_with("old_shuffled_playlist_id")
+    mock_update_index.assert_called_once()
+    assert mock_update_index.call_args[0][0] == "user_id"
+    assert mock_update_index.call_args[0][1] == "playlist_id"
+    assert mock_update_index.call_args[0][2]["shuffled_playlist_id"] == "new_playlist_id"
+
+
 def test_shuffle_playlist_user_not_found_success(mocker, env_patch):
     # Testcase where cannot update trackers however shuffle can still proceed
     # Prepare mocks
@@ -136,6 +210,7 @@ def test_shuffle_playlist_user_not_found_success(mocker, env_patch):
 
 def test_shuffle_playlist_playlist_tracks_empty_failure(mocker, env_patch):
     # Prepare mocks
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
     mocker.patch("utils.util.get_tracks_from_playlist", return_value=None)
 
     response = shuffle_playlist(spotify_auth_sample, "playlist_id", "playlist_name")
@@ -169,8 +244,63 @@ def test_create_playlist_from_liked_tracks_success(mocker, env_patch):
 
 def test_screate_playlist_from_liked_tracks_tracks_empty_failure(mocker, env_patch):
     # Prepare mocks
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
     mocker.patch("utils.util.get_tracks_from_playlist", return_value=None)
 
     response = create_playlist_from_liked_tracks(spotify_auth_sample, "playlist_name")
 
     assert response["error"] == "No tracks found for user's liked songs"
+
+
+############ delete_all_shuffled_playlists ################
+
+
+def test_delete_all_shuffled_playlists_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch.object(Spotify, "current_user_playlists", side_effect=[
+        {
+            "items": [
+                {"name": SHUFFLED_PLAYLIST_PREFIX + "playlist0", "id": "shuffled0"},
+                {"name": "playlist1", "id": "playlist1"}
+            ],
+            "next": "next_page",
+            "total": 3
+        },
+        {
+            "items": [
+                {"name": SHUFFLED_PLAYLIST_PREFIX + "playlist2", "id": "shuffled2"}
+            ],
+            "next": None,
+            "total": 3
+        }
+    ])
+    mock_unfollow = mocker.patch.object(Spotify, "current_user_unfollow_playlist", return_value=None)
+    mock_clear_index = mocker.patch.object(database, "delete_user_shuffled_playlists", return_value=None)
+
+    response = delete_all_shuffled_playlists(spotify_auth_sample)
+
+    assert response["status"] == "success"
+    assert response["deleted_playlists_count"] == 2
+    assert response["failed_playlists_count"] == 0
+    assert sorted(call[0][0] for call in mock_unfollow.call_args_list) == ["shuffled0", "shuffled2"]
+    assert mock_clear_index.call_args[0][0] == "user_id"
+    assert sorted(mock_clear_index.call_args[0][1]) == ["shuffled0", "shuffled2"]
+
+
+def test_delete_all_shuffled_playlists_unfollow_error_failure(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+    mocker.patch.object(Spotify, "current_user_playlists", return_value=all_user_playlists_response_sample)
+    mocker.patch.object(Spotify, "current_user_unfollow_playlist", side_effect=Exception("mocked error"))
+    mock_clear_index = mocker.patch.object(database, "delete_user_shuffled_playlists", return_value=None)
+
+    response = delete_all_shuffled_playlists(spotify_auth_sample)
+
+    assert response["status"] == "success"
+    assert response["deleted_playlists_count"] == 0
+    assert response["failed_playlists_count"] == 1
+    # The playlist is still followed, so its index entry is kept
+    mock_clear_index.assert_not_called()
@@ -0,0 +1,151 @@
+from tests import env_patch  # noqa: F401
+
+from spotipy.oauth2 import SpotifyOAuth
+from main import app
+from database import database
+from utils import util
+from pymongo.errors import BulkWriteError
+
+from tests.functional.helpers.mock_requests import *
+from tasks.tracker_tasks import update_all_user_trackers
+from classes.token_bucket import TokenBucket
+
+
+def create_tracker_user(user_id):
+    return {
+        "user_id": user_id,
+        "user_attributes": {
+            "trackers_enabled": True
+        },
+        "spotify": spotify_auth_sample
+    }
+
+
+############ update_all_user_trackers ################
+
+
+def test_update_all_user_trackers_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch.object(database, "get_all_users_with_attribute",
+                        return_value=iter([create_tracker_user("user0"), create_tracker_user("user1")]))
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
+    mock_refresh = mocker.patch.object(SpotifyOAuth, "refresh_access_token", return_value=spotify_auth_sample)
+    mocker.patch.object(util, "probe_liked_tracks_count", return_value={"count": 25, "etag": None, "changed": True})
+    mock_latest_counts = mocker.patch.object(database, "find_users_latest_liked_tracks_counts",
+                                             return_value={"user0": 20})
+    mock_insert = mocker.patch.object(database, "insert_liked_tracks_history_entries", return_value=None)
+
+    response = update_all_user_trackers()
+
+    assert response["status"] == "success"
+    assert response["updated_users"] == 2
+    assert response["total_enabled_users"] == 2
+    assert response["outcomes"]["updated"] == 2
+    mock_latest_counts.assert_called_once_with(["user0", "user1"])
+    # Stored tokens are still valid so aren't refreshed
+    mock_refresh.assert_not_called()
+    # Both entries are written in one batch
+    mock_insert.assert_called_once()
+    tracker_entries = {entry["user_id"]: entry for entry in mock_insert.call_args[0][0]}
+    assert tracker_entries["user0"]["difference"] == 5
+    assert tracker_entries["user1"]["difference"] == 0
+
+
+def test_update_all_user_trackers_outcome_counts_success(mocker, env_patch):
+    # Prepare mocks
+    mock_progress = mocker.patch("utils.util.update_task_progress", return_value=None)
+    invalid_user = {"user_id": "invalid_user", "user_attributes": {"trackers_enabled": True}}
+    mocker.patch.object(database, "get_all_users_with_attribute",
+                        return_value=iter([create_tracker_user("user0"), invalid_user]))
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
+    mocker.patch.object(SpotifyOAuth, "refresh_access_token", return_value=spotify_auth_sample)
+    mocker.patch.object(util, "probe_liked_tracks_count", return_value={"count": 25, "etag": None, "changed": True})
+    mocker.patch.object(database, "find_users_latest_liked_tracks_counts", return_value={})
+    mocker.patch.object(database, "insert_liked_tracks_history_entries", side_effect=Exception("DB error"))
+
+    response = update_all_user_trackers()
+
+    assert response["updated_users"] == 0
+    assert response["total_enabled_users"] == 2
+    assert response["outcomes"]["invalid_user_entry"] == 1
+    assert response["outcomes"]["insert_failed"] == 1
+    final_progress = mock_progress.call_args[1]["meta"]["progress"]
+    assert final_progress["processed"] == 2
+    assert final_progress["total"] == 2
+
+
+def test_update_all_user_trackers_insert_batches_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch.object(database, "get_all_users_with_attribute",
+                        return_value=iter([create_tracker_user("user" + str(i)) for i in range(5)]))
+    mocker.patch.object(SpotifyOAuth, "validate_token", return_value=spotify_auth_sample)
+    mocker.patch.object(SpotifyOAuth, "refresh_access_token", return_value=spotify_auth_sample)
+    mocker.patch.object(util, "probe_liked_tracks_count", return_value={"count": 25, "etag": None, "changed": True})
+    mocker.patch.object(database, "find_users_latest_liked_tracks_counts", return_value={})
+    mock_insert = mocker.patch.object(database, "insert_liked_tracks_history_entries", side_effect=[
+        None,
+        BulkWriteError({"writeErrors": [{"index": 1}]}),
+        None
+    ])
+
+    with app.app_context():
+        mocker.patch.dict(app.config, {"TRACKER_INSERT_BATCH_SIZE": 2, "TRACKER_UPDATE_RATE_PER_SECOND": 100})
+        response = update_all_user_trackers.run()
+
+    assert [len(call[0][0]) for call in mock_insert.call_args_list] == [2, 2, 1]
+    assert response["updated_users"] == 4
+    assert response["outcomes"]["insert_failed"] == 1
+
+
+def test_update_all_user_trackers_unchanged_etag_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    unchanged_user = create_tracker_user("user0")
+    unchanged_user["liked_tracks_etag"] = "etag0"
+    changed_user = create_tracker_user("user1")
+    changed_user["liked_tracks_etag"] = "etag1"
+    mocker.patch.object(database, "get_all_users_with_attribute", return_value=iter([unchanged_user, changed_user]))
+    mocker.patch.object(database, "find_users_latest_liked_tracks_counts", return_value={"user0": 20, "user1": 30})
+
+    def probe(spotify, etag=None):
+        if etag == "etag0":
+            return {"count": None, "etag": "etag0", "changed": False}
+        return {"count": 35, "etag": "etag1_new", "changed": True}
+    mock_probe = mocker.patch.object(util, "probe_liked_tracks_count", side_effect=probe)
+    mock_insert = mocker.patch.object(database, "insert_liked_tracks_history_entries", return_value=None)
+    mock_update_etags = mocker.patch.object(database, "update_users_liked_tracks_etags", return_value=None)
+
+    response = update_all_user_trackers()
+
+    assert response["updated_users"] == 2
+    assert sorted(call[0][1] for call in mock_probe.call_args_list) == ["etag0", "etag1"]
+    tracker_entries = {entry["user_id"]: entry for entry in mock_insert.call_args[0][0]}
+    # Unchanged library reuses the previous count
+    assert tracker_entries["user0"]["count"] == 20
+    assert tracker_entries["user0"]["difference"] == 0
+    assert tracker_entries["user1"]["count"] == 35
+    assert tracker_entries["user1"]["difference"] == 5
+    # Only changed ETags are saved
+    mock_update_etags.assert_called_once_with({"user1": "etag1_new"})
+
+
+def test_update_all_user_trackers_no_users_success(mocker, env_patch):
+    # Prepare mocks
+    mocker.patch("utils.util.update_task_progress", return_value=None)
+    mocker.patch.object(database, "get_all_users_with_attribute", return_value=iter([]))
+
+    response = update_all_user_trackers()
+
+    assert response["status"] == "success"
+    assert response["updated_users"] == 0
+    assert response["total_enabled_users"] == 0
+
+
+def test_token_bucket_limits_burst():
+    limiter = TokenBucket(rate=0.001, capacity=2)
+
+    assert limiter.try_acquire() is True
+    assert limiter.try_acquire() is True
+    assert limiter.try_acquire() is False
@@ -0,0 +1,64 @@
+import random
+
+from utils import audio_feature_matrix_utils
+from tests.functional.helpers.audio_features import (
+    FEATURE_NAMES, get_loop_audio_features, get_matrix_audio_features)
+
+
+def create_random_audio_features(random_generator, track_count):
+    all_audio_features = []
+    for index in range(track_count):
+        if index % 17 == 0:
+            all_audio_features.append(None)
+            continue
+        audio_features = {"id": "track" + str(index)}
+        for feature_name in FEATURE_NAMES:
+            if index % 13 == 0 and feature_name == "energy":
+                continue
+            # Rounded values give ties for highest and lowest
+            audio_features[feature_name] = round(random_generator.uniform(-60, 200), 1)
+        audio_features["liveness"] = None if index % 11 == 0 else audio_features["liveness"]
+        all_audio_features.append(audio_features)
+    return all_audio_features
+
+
+def test_summarise_audio_features_matches_loop_success():
+    all_audio_features = create_random_audio_features(random.Random(0), 2000)
+
+    assert get_matrix_audio_features(all_audio_features) == get_loop_audio_features(all_audio_features)
+
+
+def test_summarise_audio_features_missing_and_int_values_success():
+    all_audio_features = [
+        None,
+        {"id": "track1", "instrumentalness": 0, "tempo": 120.5},
+        {"id": "track2", "instrumentalness": 1, "tempo": 120.5},
+        {"id": "track3", "instrumentalness": 0}
+    ]
+
+    matrix_audio_features = get_matrix_audio_features(all_audio_features)
+
+    assert matrix_audio_features == get_loop_audio_features(all_audio_features)
+    instrumentalness = matrix_audio_features[FEATURE_NAMES.index("instrumentalness")]
+    assert type(instrumentalness["total_score"]) is int
+    assert instrumentalness["lowest_feature_score"] == {"id": "track1", "value": 0}
+    tempo = matrix_audio_features[FEATURE_NAMES.index("tempo")]
+    assert tempo["highest_feature_score"] == {"id": "track1", "value": 120.5}
+    assert matrix_audio_features[FEATURE_NAMES.index("energy")]["highest_feature_score"] == {"id": "", "value": 0}
+
+
+def test_summarise_audio_features_no_tracks_success():
+    assert get_matrix_audio_features([None]) == get_loop_audio_features([None])
+    assert audio_feature_matrix_utils.summarise_audio_features([], FEATURE_NAMES)[0]["total_score"] == 0
+
+
+def test_audio_feature_distribution_success():
+    all_audio_features = [None] + [{"id": "track" + str(index), "energy": index / 10} for index in range(11)]
+
+    percentiles = audio_feature_matrix_utils.get_audio_feature_percentiles(all_audio_features, FEATURE_NAMES, [0, 50, 100])
+    histograms = audio_feature_matrix_utils.get_audio_feature_histograms(all_audio_features, FEATURE_NAMES, bins=2)
+
+    assert percentiles["energy"] == [0.0, 0.5, 1.0]
+    assert percentiles["tempo"] is None
+    assert histograms["energy"] == {"counts": [5, 6], "bin_edges": [0.0, 0.5, 1.0]}
+    assert histograms["tempo"] is None
@@ -0,0 +1,81 @@
+from flask import Flask
+from tests import env_patch  # noqa: F401
+
+from spotipy import Spotify
+from classes.redis_audio_features_cache import RedisAudioFeaturesCache
+from utils import audio_features_cache_utils
+from utils.audio_features_cache_utils import get_all_track_audio_features_with_cache
+
+app = Flask('test')
+app.config["TASK_PROGRESS_MIN_INTERVAL_SECONDS"] = 1
+app.config["TASK_PROGRESS_MIN_PERCENT_DELTA"] = 1
+
+
+def create_audio_features(track_id, value):
+    return {
+        "id": track_id,
+        "acousticness": value,
+        "danceability": value,
+        "energy": value,
+        "instrumentalness": 0,
+        "liveness": value,
+        "loudness": -value,
+        "speechiness": value,
+        "tempo": 120.5,
+        "valence": value
+    }
+
+
+class MockAudioFeaturesCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get_many(self, track_ids):
+        return {
+            track_id: RedisAudioFeaturesCache.decode(track_id, self.entries[track_id])
+            for track_id in track_ids if track_id in self.entries
+        }
+
+    def set_many(self, audio_features_by_id):
+        for track_id, audio_features in audio_features_by_id.items():
+            self.entries[track_id] = RedisAudioFeaturesCache.encode(audio_features)
+
+
+def test_audio_features_cache_encoding_round_trip_success():
+    audio_features = create_audio_features("track0", 0.25)
+
+    assert RedisAudioFeaturesCache.decode("track0", RedisAudioFeaturesCache.encode(audio_features)) == audio_features
+    assert RedisAudioFeaturesCache.decode("track0", RedisAudioFeaturesCache.encode(None)) is None
+
+
+def test_get_all_track_audio_features_with_cache_only_requests_misses_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        mocker.patch.object(audio_features_cache_utils, "get_audio_features_cache",
+                            return_value=MockAudioFeaturesCache())
+        mock_audio_features = mocker.patch.object(Spotify, "audio_features", side_effect=[
+            [create_audio_features("track0", 0.1), None],
+            [create_audio_features("track2", 0.3)]
+        ])
+
+        first_features = get_all_track_audio_features_with_cache(None, Spotify(), ["track0", "track1"])
+        second_features = get_all_track_audio_features_with_cache(None, Spotify(), ["track2", "track1", "track0"])
+
+        assert first_features == [create_audio_features("track0", 0.1), None]
+        assert second_features == [create_audio_features("track2", 0.3), None, create_audio_features("track0", 0.1)]
+        # Tracks without features are cached too so only the new track is requested
+        assert mock_audio_features.call_args_list[1][0][0] == ["track2"]
+
+
+def test_get_all_track_audio_features_with_cache_error_falls_back_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        audio_features_cache = mocker.Mock()
+        audio_features_cache.get_many.side_effect = Exception("Redis unavailable")
+        audio_features_cache.set_many.side_effect = Exception("Redis unavailable")
+        mocker.patch.object(audio_features_cache_utils, "get_audio_features_cache", return_value=audio_features_cache)
+        mocker.patch.object(Spotify, "audio_features", return_value=[create_audio_features("track0", 0.1)])
+
+        audio_features = get_all_track_audio_features_with_cache(None, Spotify(), ["track0"])
+
+        assert audio_features == [create_audio_features("track0", 0.1)]
@@ -0,0 +1,92 @@
+from flask import Flask
+from tests import env_patch  # noqa: F401
+
+from spotipy import Spotify
+from classes.redis_track_uri_cache import RedisTrackUriCache
+from utils import util, playlist_cache_utils
+from utils.playlist_cache_utils import get_tracks_from_playlist_with_cache
+
+app = Flask('test')
+
+sample_tracks_list = [
+    "spotify:track:sometrack0",
+    "spotify:local:artist:album:local+track:200",
+    "spotify:track:sometrack2"
+]
+
+
+class MockTrackUriCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        value = self.entries.get(key)
+        return None if value is None else RedisTrackUriCache.decode(value)
+
+    def set(self, key, track_uris):
+        self.entries[key] = RedisTrackUriCache.encode(track_uris)
+
+
+def test_track_uri_cache_encoding_round_trip_success():
+    encoded = RedisTrackUriCache.encode(sample_tracks_list)
+
+    assert RedisTrackUriCache.decode(encoded) == sample_tracks_list
+    assert RedisTrackUriCache.decode(RedisTrackUriCache.encode([])) == []
+
+
+def test_get_tracks_from_playlist_with_cache_hit_for_same_snapshot_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        track_uri_cache = MockTrackUriCache()
+        mocker.patch.object(playlist_cache_utils, "get_track_uri_cache", return_value=track_uri_cache)
+        mock_playlist = mocker.patch.object(Spotify, "playlist", return_value={"snapshot_id": "snapshot0"})
+        mock_get_tracks = mocker.patch.object(util, "get_tracks_from_playlist", return_value=sample_tracks_list)
+
+        first_tracks = get_tracks_from_playlist_with_cache(None, Spotify(), "playlist0", "user_id")
+        second_tracks = get_tracks_from_playlist_with_cache(None, Spotify(), "playlist0", "user_id")
+
+        assert first_tracks == sample_tracks_list
+        assert second_tracks == sample_tracks_list
+        assert mock_get_tracks.call_count == 1
+        mock_playlist.assert_called_with("playlist0", fields="snapshot_id")
+        assert list(track_uri_cache.entries.keys()) == ["playlist:playlist0:snapshot0"]
+
+
+def test_get_tracks_from_playlist_with_cache_miss_for_new_snapshot_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch.object(playlist_cache_utils, "get_track_uri_cache", return_value=MockTrackUriCache())
+        mocker.patch.object(Spotify, "playlist", side_effect=[{"snapshot_id": "snapshot0"}, {"snapshot_id": "snapshot1"}])
+        mock_get_tracks = mocker.patch.object(util, "get_tracks_from_playlist", return_value=sample_tracks_list)
+
+        get_tracks_from_playlist_with_cache(None, Spotify(), "playlist0", "user_id")
+        get_tracks_from_playlist_with_cache(None, Spotify(), "playlist0", "user_id")
+
+        assert mock_get_tracks.call_count == 2
+
+
+def test_get_tracks_from_playlist_with_cache_liked_tracks_key_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        track_uri_cache = MockTrackUriCache()
+        mocker.patch.object(playlist_cache_utils, "get_track_uri_cache", return_value=track_uri_cache)
+        mock_saved_tracks = mocker.patch.object(Spotify, "current_user_saved_tracks", return_value={
+            "items": [{"added_at": "2024-01-01T00:00:00Z"}],
+            "total": 3
+        })
+        mocker.patch.object(util, "get_tracks_from_playlist", return_value=sample_tracks_list)
+
+        get_tracks_from_playlist_with_cache(None, Spotify(), util.LIKED_TRACKS_PLAYLIST_ID, "user_id")
+
+        mock_saved_tracks.assert_called_once_with(limit=1)
+        assert list(track_uri_cache.entries.keys()) == ["liked:user_id:3:2024-01-01T00:00:00Z"]
+
+
+def test_get_tracks_from_playlist_with_cache_error_falls_back_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        mocker.patch.object(playlist_cache_utils, "get_track_uri_cache", return_value=MockTrackUriCache())
+        mocker.patch.object(Spotify, "playlist", side_effect=Exception("Spotify error"))
+        mock_get_tracks = mocker.patch.object(util, "get_tracks_from_playlist", return_value=sample_tracks_list)
+
+        tracks = get_tracks_from_playlist_with_cache(None, Spotify(), "playlist0", "user_id")
+
+        assert tracks == sample_tracks_list
+        mock_get_tracks.assert_called_once()
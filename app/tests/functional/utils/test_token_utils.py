@@ -0,0 +1,92 @@
+import time
+from flask import Flask
+from spotipy.oauth2 import SpotifyOauthError
+from tests import env_patch  # noqa: F401
+from database import database
+
+from utils.token_utils import get_user_token_info
+
+app = Flask('test')
+app.config["SPOTIFY_TOKEN_REFRESH_THRESHOLD_SECONDS"] = 300
+
+refreshed_token_info = {
+    "access_token": "new access token",
+    "refresh_token": "refresh token",
+    "expires_at": int(time.time()) + 3600,
+    "scope": "user-library-read"
+}
+
+
+def create_user(expires_in_seconds, include_access_token=True):
+    spotify = {
+        "refresh_token": "refresh token",
+        "expires_at": int(time.time()) + expires_in_seconds,
+        "scope": "user-library-read"
+    }
+    if include_access_token:
+        spotify["access_token"] = "stored access token"
+    return {"user_id": "user123", "spotify": spotify}
+
+
+def test_get_user_token_info_reuses_valid_token_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        auth_manager = mocker.Mock()
+        mock_update = mocker.patch.object(database, "update_user_spotify_token")
+        user = create_user(3600)
+
+        token_info = get_user_token_info(app, auth_manager, user)
+
+        assert token_info["access_token"] == "stored access token"
+        auth_manager.refresh_access_token.assert_not_called()
+        mock_update.assert_not_called()
+
+
+def test_get_user_token_info_refreshes_near_expiry_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        auth_manager = mocker.Mock()
+        auth_manager.refresh_access_token.return_value = refreshed_token_info
+        mock_update = mocker.patch.object(database, "update_user_spotify_token")
+        user = create_user(120)
+
+        token_info = get_user_token_info(app, auth_manager, user)
+
+        assert token_info["access_token"] == "new access token"
+        auth_manager.refresh_access_token.assert_called_once_with("refresh token")
+        mock_update.assert_called_once_with("user123", refreshed_token_info)
+
+
+def test_get_user_token_info_refreshes_without_stored_access_token_success(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        auth_manager = mocker.Mock()
+        auth_manager.refresh_access_token.return_value = refreshed_token_info
+        mocker.patch.object(database, "update_user_spotify_token")
+        user = create_user(3600, include_access_token=False)
+
+        token_info = get_user_token_info(app, auth_manager, user)
+
+        assert token_info["access_token"] == "new access token"
+
+
+def test_get_user_token_info_refresh_error_failure(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        auth_manager = mocker.Mock()
+        auth_manager.refresh_access_token.side_effect = SpotifyOauthError("invalid_grant")
+        mock_update = mocker.patch.object(database, "update_user_spotify_token")
+        user = create_user(0)
+
+        token_info = get_user_token_info(app, auth_manager, user)
+
+        assert token_info is None
+        mock_update.assert_not_called()
+
+
+def test_get_user_token_info_save_error_still_returns_token(mocker, env_patch):  # noqa: F811
+    with app.app_context():
+        auth_manager = mocker.Mock()
+        auth_manager.refresh_access_token.return_value = refreshed_token_info
+        mocker.patch.object(database, "update_user_spotify_token", side_effect=Exception("DB error"))
+        user = create_user(0)
+
+        token_info = get_user_token_info(app, auth_manager, user)
+
+        assert token_info["access_token"] == "new access token"
@@ -1,12 +1,17 @@
 from flask import Flask
 from tests import env_patch
 
+import requests
 from spotipy import Spotify
 from database import database
 
 from tests.functional.helpers.mock_requests import *
 from tests.functional.helpers.mock_responses import *
-from utils.util import get_tracks_from_playlist, create_new_playlist_with_tracks
+from utils.util import (
+    get_tracks_from_playlist, create_new_playlist_with_tracks, iterate_playlist_items,
+    get_user_id, probe_liked_tracks_count, create_task_progress_reporter
+)
+from classes import task_progress_reporter
 
 SPOTIFY_PLAYLIST_URL = "open.spotify.com/playlist/spotifyPlaylistUrl"
 
@@ -28,6 +33,9 @@ sample_tracks_list = [
 ]
 
 app = Flask('test')
+app.config["SPOTIFY_USER_PROFILE_CACHE_TTL_SECONDS"] = 300
+app.config["TASK_PROGRESS_MIN_INTERVAL_SECONDS"] = 1
+app.config["TASK_PROGRESS_MIN_PERCENT_DELTA"] = 1
 
 
 ############ get_tracks_from_playlist ################
@@ -101,6 +109,76 @@ def test_get_tracks_from_playlist_error_getting_liked_songs_failure(mocker, env_
             assert str(e) == "current_user_saved_tracks error"
 
 
+def test_get_tracks_from_playlist_concurrent_pages_keeps_order_success(mocker, env_patch):
+    with app.app_context():
+        # Prepare mocks
+        def mock_playlist_items(playlist_id, fields, limit, offset):
+            return {
+                "total": 250,
+                "items": [
+                    {"track": {"uri": "spotify:track:" + str(i)}} for i in range(offset, min(offset + limit, 250))
+                ]
+            }
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        mock_items = mocker.patch.object(Spotify, "playlist_items", side_effect=mock_playlist_items)
+
+        all_tracks = get_tracks_from_playlist(None, Spotify(), "playlist_id", max_workers=4)
+
+        assert mock_items.call_count == 3
+        assert all_tracks == ["spotify:track:" + str(i) for i in range(250)]
+
+
+def test_get_tracks_from_playlist_requests_uri_fields_only_success(mocker, env_patch):
+    with app.app_context():
+        # Prepare mocks
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        mock_items = mocker.patch.object(Spotify, "playlist_items", side_effect=[mock_tracks_response])
+
+        get_tracks_from_playlist(None, Spotify(), "playlist_id")
+
+        mock_items.assert_called_once_with("playlist_id", fields="items(track(uri)),total,next", limit=100, offset=0)
+
+
+def test_iterate_playlist_items_streams_pages_success(mocker, env_patch):
+    with app.app_context():
+        # Prepare mocks
+        def mock_saved_tracks(limit, offset):
+            return {
+                "total": 120,
+                "items": [{"track": {"id": str(i)}} for i in range(offset, min(offset + limit, 120))]
+            }
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        mock_saved = mocker.patch.object(Spotify, "current_user_saved_tracks", side_effect=mock_saved_tracks)
+
+        items = iterate_playlist_items(None, Spotify(), "likedTracks")
+        first_item = next(items)
+
+        # Only the first page is retrieved until more items are consumed
+        assert first_item["track"]["id"] == "0"
+        assert mock_saved.call_count == 1
+        assert len(list(items)) == 119
+        assert mock_saved.call_count == 3
+
+
+def test_iterate_playlist_items_throttles_progress_success(mocker, env_patch):
+    with app.app_context():
+        # Prepare mocks
+        def mock_saved_tracks(limit, offset):
+            return {
+                "total": 5000,
+                "items": [{"track": {"id": str(i)}} for i in range(offset, min(offset + limit, 5000))]
+            }
+        mocker.patch.object(Spotify, "current_user_saved_tracks", side_effect=mock_saved_tracks)
+        mock_task = mocker.Mock()
+
+        assert len(list(iterate_playlist_items(mock_task, Spotify(), "likedTracks"))) == 5000
+
+        # First and final page progress only, pages in between are within the minimum interval
+        assert mock_task.update_state.call_count == 2
+        assert mock_task.update_state.call_args_list[0][1]["meta"]["progress"] == {
+            "state": "Retrieved 50 tracks so far...", "done": 50, "total": 5000, "percent": 1.0}
+        assert mock_task.update_state.call_args[1]["meta"]["progress"]["done"] == 5000
+
 
 
 ############ create_new_playlist_with_tracks ################
@@ -121,6 +199,26 @@ def test_create_new_playlist_with_tracks_success(mocker, env_patch):
         assert response["num_of_tracks"] == 3
         assert response["creation_time"] is not None
 
+
+def test_create_new_playlist_with_tracks_exact_multiple_of_chunk_size_success(mocker, env_patch):
+    with app.app_context():
+        # Prepare mocks
+        mocker.patch("utils.util.update_task_progress", return_value=None)
+        mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+        mocker.patch.object(Spotify, "user_playlist_create", return_value=create_user_playlist_response)
+        mock_add_items = mocker.patch.object(Spotify, "playlist_add_items", return_value=playlist_add_items_response)
+
+        tracks_list = ["spotify:track:sometrack" + str(i) for i in range(200)]
+
+        response = create_new_playlist_with_tracks(None, Spotify(), "new_playlist_name", False, "playlist_description", tracks_list)
+
+        assert response["status"] == "success"
+        assert response["num_of_tracks"] == 200
+        assert mock_add_items.call_count == 2
+        assert mock_add_items.call_args_list[0][0][1] == tracks_list[:100]
+        assert mock_add_items.call_args_list[1][0][1] == tracks_list[100:]
+
+
 def test_create_new_playlist_with_tracks_track_list_contains_invalid_values_failure(mocker, env_patch):
     with app.app_context():
         # Prepare mocks
@@ -199,3 +297,88 @@ def test_create_new_playlist_with_tracks_error_adding_items_failure(mocker, env_
         assert response["error"] == "Unable to create new playlist / add tracks to playlist"
 
 
+
+
+############ get_user_id ################
+
+
+def test_get_user_id_from_session_user_id_success(mocker, env_patch):
+    with app.app_context():
+        mock_me = mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+
+        user_id = get_user_id(Spotify(), {"user_id": "session_user_id", "access_token": "access_token"})
+
+        assert user_id == "session_user_id"
+        mock_me.assert_not_called()
+
+
+def test_get_user_id_profile_cached_by_access_token_success(mocker, env_patch):
+    with app.app_context():
+        mock_me = mocker.patch.object(Spotify, "me", return_value=mock_user_details_response)
+
+        first_user_id = get_user_id(Spotify(), {"access_token": "access_token"})
+        second_user_id = get_user_id(Spotify(), {"access_token": "access_token"})
+        get_user_id(Spotify(), {"access_token": "other_access_token"})
+
+        assert first_user_id == "user_id"
+        assert second_user_id == "user_id"
+        assert mock_me.call_count == 2
+
+
+############ probe_liked_tracks_count ################
+
+
+def test_probe_liked_tracks_count_requests_single_track_success(mocker, env_patch):
+    mock_response = mocker.Mock(status_code=200, headers={"ETag": "etag0"})
+    mock_response.json.return_value = {"items": [{}], "total": 123}
+    mock_get = mocker.patch.object(requests.Session, "get", return_value=mock_response)
+
+    probe = probe_liked_tracks_count(Spotify(auth="access_token"))
+
+    assert probe == {"count": 123, "etag": "etag0", "changed": True}
+    assert mock_get.call_args[1]["params"] == {"limit": 1}
+    assert "If-None-Match" not in mock_get.call_args[1]["headers"]
+
+
+def test_probe_liked_tracks_count_not_modified_success(mocker, env_patch):
+    mock_response = mocker.Mock(status_code=304, headers={})
+    mock_get = mocker.patch.object(requests.Session, "get", return_value=mock_response)
+
+    probe = probe_liked_tracks_count(Spotify(auth="access_token"), "etag0")
+
+    assert probe == {"count": None, "etag": "etag0", "changed": False}
+    assert mock_get.call_args[1]["headers"]["If-None-Match"] == "etag0"
+    mock_response.json.assert_not_called()
+
+
+############ create_task_progress_reporter ################
+
+
+def test_task_progress_reporter_throttles_by_time_and_percent_success(mocker, env_patch):
+    with app.app_context():
+        mock_monotonic = mocker.patch.object(task_progress_reporter.time, "monotonic")
+        mock_progress = mocker.patch("utils.util.update_task_progress", return_value=None)
+        progress_reporter = create_task_progress_reporter(None)
+
+        mock_monotonic.return_value = 0
+        assert progress_reporter.update("Step 1", 1, 1000) is True
+        # Within minimum interval
+        mock_monotonic.return_value = 0.5
+        assert progress_reporter.update("Step 200", 200, 1000) is False
+        # Interval passed but progress moved less than the minimum percent
+        mock_monotonic.return_value = 2
+        assert progress_reporter.update("Step 5", 5, 1000) is False
+        mock_monotonic.return_value = 3
+        assert progress_reporter.update("Step 500", 500, 1000) is True
+        # Text only progress is limited by time
+        mock_monotonic.return_value = 3.5
+        assert progress_reporter.update("Checking") is False
+        assert progress_reporter.flush() is True
+        assert progress_reporter.flush() is False
+        # Final progress is always sent
+        assert progress_reporter.update("Step 1000", 1000, 1000, outcomes={"updated": 1000}) is True
+
+        assert [call[1]["meta"]["progress"]["state"] for call in mock_progress.call_args_list] == [
+            "Step 1", "Step 500", "Checking", "Step 1000"]
+        assert mock_progress.call_args[1]["meta"]["progress"] == {
+            "state": "Step 1000", "done": 1000, "total": 1000, "percent": 100.0, "outcomes": {"updated": 1000}}
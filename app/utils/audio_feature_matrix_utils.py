@@ -0,0 +1,84 @@
+import operator
+from typing import List
+import numpy as np
+
+
+def create_audio_feature_matrix(all_audio_features: list, feature_names: List[str]):
+    """
+    Pack audio features into a tracks x features matrix, missing values are NaN
+    Tracks without audio features are left out
+    Return the tracks in matrix row order and the matrix
+    """
+    tracks = [track for track in all_audio_features if track is not None]
+    try:
+        # Audio features normally have every feature, so get them all with one call per track
+        rows = list(map(operator.itemgetter(*feature_names), tracks))
+    except KeyError:
+        rows = [[track.get(feature_name) for feature_name in feature_names] for track in tracks]
+    matrix = np.array(rows, dtype=float).reshape(len(tracks), len(feature_names))
+    return tracks, matrix
+
+
+def summarise_audio_features(all_audio_features: list, feature_names: List[str]):
+    """
+    Total and find the highest and lowest score of each feature in one pass over the matrix
+    Matches adding tracks one at a time: totals are summed in track order and the first track wins ties
+    Return a dict with total_score, highest_feature_score and lowest_feature_score for each feature
+    """
+    tracks, matrix = create_audio_feature_matrix(all_audio_features, feature_names)
+    is_missing = np.isnan(matrix)
+    has_values = ~is_missing.all(axis=0)
+    summaries = []
+    if len(tracks) > 0:
+        # cumsum adds in row order, unlike sum which adds pairwise and can differ in the last bits
+        totals = np.cumsum(np.where(is_missing, 0.0, matrix), axis=0)[-1]
+        highest_rows = np.argmax(np.where(is_missing, -np.inf, matrix), axis=0)
+        lowest_rows = np.argmin(np.where(is_missing, np.inf, matrix), axis=0)
+    for column, feature_name in enumerate(feature_names):
+        if len(tracks) == 0 or not has_values[column]:
+            summaries.append({
+                "total_score": 0,
+                "highest_feature_score": {"id": "", "value": 0},
+                "lowest_feature_score": {"id": "", "value": 0}
+            })
+            continue
+        total_score = float(totals[column])
+        # Totals of int values stay ints
+        if not any(isinstance(track.get(feature_name), float) for track in tracks):
+            total_score = int(total_score)
+        highest_track = tracks[highest_rows[column]]
+        lowest_track = tracks[lowest_rows[column]]
+        summaries.append({
+            "total_score": total_score,
+            "highest_feature_score": {"id": highest_track["id"], "value": highest_track[feature_name]},
+            "lowest_feature_score": {"id": lowest_track["id"], "value": lowest_track[feature_name]}
+        })
+    return summaries
+
+
+def get_audio_feature_percentiles(all_audio_features: list, feature_names: List[str], percentiles: List[float]):
+    """
+    Return the given percentiles of each feature, or None for features without values
+    """
+    _, matrix = create_audio_feature_matrix(all_audio_features, feature_names)
+    feature_percentiles = {}
+    for column, feature_name in enumerate(feature_names):
+        values = matrix[:, column][~np.isnan(matrix[:, column])]
+        feature_percentiles[feature_name] = np.percentile(values, percentiles).tolist() if len(values) > 0 else None
+    return feature_percentiles
+
+
+def get_audio_feature_histograms(all_audio_features: list, feature_names: List[str], bins: int = 10):
+    """
+    Return histogram counts and bin edges of each feature, or None for features without values
+    """
+    _, matrix = create_audio_feature_matrix(all_audio_features, feature_names)
+    feature_histograms = {}
+    for column, feature_name in enumerate(feature_names):
+        values = matrix[:, column][~np.isnan(matrix[:, column])]
+        if len(values) == 0:
+            feature_histograms[feature_name] = None
+            continue
+        counts, bin_edges = np.histogram(values, bins=bins)
+        feature_histograms[feature_name] = {"counts": counts.tolist(), "bin_edges": bin_edges.tolist()}
+    return feature_histograms
@@ -0,0 +1,61 @@
+import threading
+from typing import List
+import spotipy
+from flask import current_app
+
+from classes.redis_audio_features_cache import RedisAudioFeaturesCache
+from utils import util
+
+# Track ids read from the cache per round trip
+AUDIO_FEATURES_CACHE_READ_BATCH_SIZE = 1000
+
+_audio_features_cache = None
+_audio_features_cache_lock = threading.Lock()
+
+
+def get_audio_features_cache(current_app):
+    """
+    Get the process wide audio features cache, or None if caching is disabled
+    """
+    global _audio_features_cache
+    if not current_app.config["CACHE_REDIS_URL"] or current_app.config["AUDIO_FEATURES_CACHE_TTL_SECONDS"] <= 0:
+        return None
+    with _audio_features_cache_lock:
+        if _audio_features_cache is None:
+            _audio_features_cache = RedisAudioFeaturesCache(current_app.config["CACHE_REDIS_URL"],
+                                                            current_app.config["AUDIO_FEATURES_CACHE_TTL_SECONDS"])
+        return _audio_features_cache
+
+
+def get_all_track_audio_features_with_cache(task, spotify: spotipy.Spotify, track_ids: List[str]) -> list:
+    """
+    Get audio features for all tracks, only requesting tracks which aren't cached from Spotify
+    Returned features are in the same order as track_ids, None for tracks without features
+    """
+    audio_features_cache = get_audio_features_cache(current_app)
+    if audio_features_cache is None:
+        return util.get_all_track_audio_features(task, spotify, track_ids)
+
+    unique_track_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id is not None))
+    audio_features_by_id = {}
+    try:
+        for index in range(0, len(unique_track_ids), AUDIO_FEATURES_CACHE_READ_BATCH_SIZE):
+            audio_features_by_id.update(audio_features_cache.get_many(
+                unique_track_ids[index: index + AUDIO_FEATURES_CACHE_READ_BATCH_SIZE]))
+    except Exception as e:
+        current_app.logger.error("Error reading audio features cache: " + str(e))
+        audio_features_by_id = {}
+
+    missing_track_ids = [track_id for track_id in unique_track_ids if track_id not in audio_features_by_id]
+    current_app.logger.info("Audio features cached for " + str(len(audio_features_by_id)) + " tracks, requesting "
+                            + str(len(missing_track_ids)))
+    if len(missing_track_ids) > 0:
+        fetched_audio_features = dict(zip(
+            missing_track_ids, util.get_all_track_audio_features(task, spotify, missing_track_ids)))
+        try:
+            audio_features_cache.set_many(fetched_audio_features)
+        except Exception as e:
+            current_app.logger.error("Error writing audio features cache: " + str(e))
+        audio_features_by_id.update(fetched_audio_features)
+
+    return [audio_features_by_id.get(track_id) for track_id in track_ids]
@@ -5,6 +5,7 @@ from flask import current_app
 from database import database
 from exceptions.custom_exceptions import SessionExpired, SessionIdNone, SessionIdNotFound
 from classes.spotify_auth import SpotifyAuth
+from classes.ttl_cache import TTLCache
 from utils.constants import (
     TRUESHUFFLE_SESSION_ID_KEY,
     SESSION_DB_USER_ID_KEY,
@@ -15,6 +16,13 @@ from utils.constants import (
     SESSION_DB_SESSION_EXPIRY_KEY
 )
 
+# Maximum number of validated sessions cached per process
+SESSION_CACHE_MAX_SIZE = 4096
+
+# Session entries keyed by hashed session id
+# Each process has its own cache so a removed session can be accepted by other processes for up to SESSION_CACHE_TTL_SECONDS
+_session_cache = TTLCache(maxsize=SESSION_CACHE_MAX_SIZE)
+
 
 def generate_session_id():
     """
@@ -32,8 +40,28 @@ def generate_hashed_session_id(session_id):
     return hashlib.sha256(session_id.encode('utf-8')).hexdigest()
 
 
+def find_session_entry(hashed_session_id):
+    """
+    Find session entry, using the in-process session cache when available
+    """
+    session_entry = _session_cache.get(hashed_session_id)
+    if session_entry is None:
+        session_entry = database.find_session(hashed_session_id)
+    return session_entry
+
+
+def cache_session_entry(hashed_session_id, session_entry):
+    """
+    Cache validated session entry for SESSION_CACHE_TTL_SECONDS
+    """
+    if session_entry is not None and current_app.config["SESSION_CACHE_TTL_SECONDS"] > 0:
+        _session_cache.set(hashed_session_id, session_entry, current_app.config["SESSION_CACHE_TTL_SECONDS"])
+
+
 def remove_session_entry(session_id):
-    database.delete_session(generate_hashed_session_id(session_id))
+    hashed_session_id = generate_hashed_session_id(session_id)
+    _session_cache.pop(hashed_session_id)
+    database.delete_session(hashed_session_id)
 
 
 def validate_session(cookies) -> SpotifyAuth:
@@ -44,8 +72,8 @@ def validate_session(cookies) -> SpotifyAuth:
     session_id = cookies.get(TRUESHUFFLE_SESSION_ID_KEY)
 
     # Find session entry with hashed session id
-    session_entry = database.find_session(
-        generate_hashed_session_id(session_id))
+    hashed_session_id = generate_hashed_session_id(session_id)
+    session_entry = find_session_entry(hashed_session_id)
     if session_entry is None:
         raise SessionIdNotFound("Unable to find session")
 
@@ -65,6 +93,8 @@ def validate_session(cookies) -> SpotifyAuth:
         remove_session_entry(session_id)
         raise SessionExpired("Session expired")
 
+    cache_session_entry(hashed_session_id, session_entry)
+
     # Return spotify auth attributes
     return SpotifyAuth.from_session_entry(session_entry)
 
@@ -72,10 +102,30 @@ def validate_session(cookies) -> SpotifyAuth:
 def extend_session_expiry(response, cookies):
     """
     Extend session expiry of cookies and database entry
+    Database entry is only updated once its remaining time falls below SESSION_EXPIRY_REFRESH_THRESHOLD_MINUTES,
+    otherwise cookies are set to the stored expiry
     """
     current_app.logger.debug("Extending session expiry")
     session_id = cookies.get(TRUESHUFFLE_SESSION_ID_KEY)
-    session_expiry = datetime.now(timezone.utc) + timedelta(hours=4)
+    hashed_session_id = generate_hashed_session_id(session_id)
+    current_datetime = datetime.now(timezone.utc)
+    session_expiry = current_datetime + timedelta(hours=4)
+
+    session_entry = find_session_entry(hashed_session_id)
+    refresh_threshold = current_datetime + timedelta(
+        minutes=current_app.config["SESSION_EXPIRY_REFRESH_THRESHOLD_MINUTES"])
+    if (
+        session_entry is not None
+        and SESSION_DB_SESSION_EXPIRY_KEY in session_entry
+        and session_entry[SESSION_DB_SESSION_EXPIRY_KEY].replace(tzinfo=timezone.utc) > refresh_threshold
+    ):
+        # Stored expiry is recent enough, skip database write
+        session_expiry = session_entry[SESSION_DB_SESSION_EXPIRY_KEY].replace(tzinfo=timezone.utc)
+    else:
+        # Update database session entry
+        entry_expiry_update = SpotifyAuth(session_expiry=session_expiry)
+        updated_session_entry = database.find_and_update_session(hashed_session_id, entry_expiry_update.to_dict())
+        cache_session_entry(hashed_session_id, updated_session_entry)
 
     # Update cookie
     response.set_cookie(key="trueshuffle-sessionId",
@@ -93,7 +143,3 @@ def extend_session_expiry(response, cookies):
                         secure=True,
                         expires=session_expiry
                         )
-
-    # Update database session entry
-    entry_expiry_update = SpotifyAuth(session_expiry=session_expiry)
-    database.find_and_update_session(generate_hashed_session_id(session_id), entry_expiry_update.to_dict())
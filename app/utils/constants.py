@@ -25,3 +25,8 @@ RECENT_SHUFFLES_PLAYLIST_NAME_KEY = "playlist_name"
 RECENT_SHUFFLES_TRACKS_SHUFFLED_KEY = "tracks_shuffled"
 RECENT_SHUFFLES_SHUFFLED_AT_KEY = "shuffled_at"
 RECENT_SHUFFLES_DURATION_SECONDS_KEY = "duration_seconds"
+
+# Shuffled Playlists
+SHUFFLED_PLAYLIST_SOURCE_ID_KEY = "playlist_id"
+SHUFFLED_PLAYLIST_ID_KEY = "shuffled_playlist_id"
+SHUFFLED_PLAYLIST_URI_KEY = "shuffled_playlist_uri"
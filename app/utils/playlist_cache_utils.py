@@ -0,0 +1,70 @@
+import threading
+from typing import List
+import spotipy
+from flask import current_app
+
+from classes.redis_track_uri_cache import RedisTrackUriCache
+from utils import util
+
+_track_uri_cache = None
+_track_uri_cache_lock = threading.Lock()
+
+
+def get_track_uri_cache(current_app):
+    """
+    Get the process wide track uri cache, or None if caching is disabled
+    """
+    global _track_uri_cache
+    if not current_app.config["CACHE_REDIS_URL"] or current_app.config["TRACK_URI_CACHE_TTL_SECONDS"] <= 0:
+        return None
+    with _track_uri_cache_lock:
+        if _track_uri_cache is None:
+            _track_uri_cache = RedisTrackUriCache(current_app.config["CACHE_REDIS_URL"],
+                                                  current_app.config["TRACK_URI_CACHE_TTL_SECONDS"])
+        return _track_uri_cache
+
+
+def get_playlist_version_key(spotify: spotipy.Spotify, playlist_id: str, user_id: str) -> str:
+    """
+    Get a key which changes whenever the playlist's tracks change, with one small call
+    Playlists use their snapshot id, Liked Tracks use the total and when the most recent track was added
+    """
+    if playlist_id == util.LIKED_TRACKS_PLAYLIST_ID:
+        liked_tracks_response = spotify.current_user_saved_tracks(limit=1)
+        latest_added_at = ""
+        if len(liked_tracks_response["items"]) > 0:
+            latest_added_at = liked_tracks_response["items"][0]["added_at"]
+        return "liked:" + user_id + ":" + str(liked_tracks_response["total"]) + ":" + latest_added_at
+    playlist_response = spotify.playlist(playlist_id, fields="snapshot_id")
+    return "playlist:" + playlist_id + ":" + playlist_response["snapshot_id"]
+
+
+def get_tracks_from_playlist_with_cache(task, spotify: spotipy.Spotify, playlist_id: str, user_id: str,
+                                        max_workers: int = 1) -> List[str]:
+    """
+    Get track uris from playlist, reusing the cached uris if the playlist hasn't changed since they were cached
+    Falls back to fetching every page if the cache is disabled or unavailable
+    """
+    track_uri_cache = get_track_uri_cache(current_app)
+    if track_uri_cache is None:
+        return util.get_tracks_from_playlist(task, spotify, playlist_id, max_workers)
+
+    cache_key = None
+    try:
+        cache_key = get_playlist_version_key(spotify, playlist_id, user_id)
+        cached_tracks = track_uri_cache.get(cache_key)
+        if cached_tracks is not None:
+            current_app.logger.info("Using cached tracks for " + cache_key)
+            util.update_task_progress(task, state='PROGRESS', meta={
+                'progress': {'state': "Retrieved " + str(len(cached_tracks)) + " tracks so far..."}})
+            return cached_tracks
+    except Exception as e:
+        current_app.logger.error("Error reading track uri cache: " + str(e))
+
+    all_tracks = util.get_tracks_from_playlist(task, spotify, playlist_id, max_workers)
+    if cache_key is not None and all_tracks is not None and len(all_tracks) > 0:
+        try:
+            track_uri_cache.set(cache_key, all_tracks)
+        except Exception as e:
+            current_app.logger.error("Error writing track uri cache: " + str(e))
+    return all_tracks
@@ -0,0 +1,45 @@
+import time
+
+from database import database
+from utils.constants import (
+    USER_ID_KEY, SESSION_DB_ACCESS_TOKEN_KEY, SESSION_DB_REFRESH_TOKEN_KEY, SESSION_DB_EXPIRES_AT_KEY,
+    SESSION_DB_SCOPE_KEY
+)
+
+USER_SPOTIFY_KEY = "spotify"
+
+
+def is_token_near_expiry(token_info: dict, threshold_seconds: int) -> bool:
+    if SESSION_DB_ACCESS_TOKEN_KEY not in token_info or token_info.get(SESSION_DB_EXPIRES_AT_KEY) is None:
+        return True
+    return int(token_info[SESSION_DB_EXPIRES_AT_KEY]) - int(time.time()) <= threshold_seconds
+
+
+def get_user_token_info(current_app, auth_manager, user):
+    """
+    Get a valid token for a stored user, reusing their stored access token until it is near expiry
+    Refreshed tokens are saved back to the user entry so later runs can reuse them
+    Return None if the token couldn't be refreshed
+    """
+    token_info = user[USER_SPOTIFY_KEY]
+    if not is_token_near_expiry(token_info, current_app.config["SPOTIFY_TOKEN_REFRESH_THRESHOLD_SECONDS"]):
+        return token_info
+
+    try:
+        refreshed_token_info = auth_manager.refresh_access_token(token_info[SESSION_DB_REFRESH_TOKEN_KEY])
+    except Exception as e:
+        current_app.logger.error("Error refreshing token for user " + user[USER_ID_KEY] + ": " + str(e))
+        return None
+    if not refreshed_token_info:
+        return None
+    try:
+        database.update_user_spotify_token(user[USER_ID_KEY], {
+            SESSION_DB_ACCESS_TOKEN_KEY: refreshed_token_info[SESSION_DB_ACCESS_TOKEN_KEY],
+            SESSION_DB_REFRESH_TOKEN_KEY: refreshed_token_info[SESSION_DB_REFRESH_TOKEN_KEY],
+            SESSION_DB_EXPIRES_AT_KEY: refreshed_token_info[SESSION_DB_EXPIRES_AT_KEY],
+            SESSION_DB_SCOPE_KEY: refreshed_token_info.get(SESSION_DB_SCOPE_KEY, token_info.get(SESSION_DB_SCOPE_KEY))
+        })
+    except Exception as e:
+        # Token is still usable for this run
+        current_app.logger.error("Error saving refreshed token for user " + user[USER_ID_KEY] + ": " + str(e))
+    return refreshed_token_info
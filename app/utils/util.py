@@ -1,9 +1,60 @@
+from collections import deque
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+import time
+from typing import Iterator, List
 from flask import current_app
 import spotipy
+from classes.task_progress_reporter import TaskProgressReporter
+from classes.ttl_cache import TTLCache
+from utils.constants import SESSION_DB_USER_ID_KEY, SESSION_DB_ACCESS_TOKEN_KEY
 
 LIKED_TRACKS_PLAYLIST_ID = "likedTracks"
+# Spotify api path of the saved tracks endpoint, for requests made without spotipy's helpers
+LIKED_TRACKS_URL = "me/tracks"
+# Largest page sizes accepted by the saved tracks and playlist items endpoints
+LIKED_TRACKS_PAGE_LIMIT = 50
+PLAYLIST_ITEMS_PAGE_LIMIT = 100
+# Largest number of tracks accepted per add items call
+PLAYLIST_ADD_ITEMS_LIMIT = 100
+# Largest page size accepted by the current user playlists endpoint
+USER_PLAYLISTS_PAGE_LIMIT = 50
+# Maximum number of Spotify user profiles cached per process
+USER_PROFILE_CACHE_MAX_SIZE = 1024
+
+# Spotify user profiles keyed by hashed access token
+_user_profile_cache = TTLCache(maxsize=USER_PROFILE_CACHE_MAX_SIZE)
+# Only request track uris (and paging info) when track data is not needed
+PLAYLIST_TRACK_URI_FIELDS = "items(track(uri)),total,next"
+
+
+def get_user_profile(spotify: spotipy.Spotify, access_token: str) -> dict:
+    """
+    Get the current user's Spotify profile
+    Profiles are cached by access token for SPOTIFY_USER_PROFILE_CACHE_TTL_SECONDS
+    """
+    cache_key = None
+    if access_token is not None:
+        cache_key = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+        user_profile = _user_profile_cache.get(cache_key)
+        if user_profile is not None:
+            return user_profile
+
+    user_profile = spotify.me()
+    if user_profile is not None and cache_key is not None:
+        _user_profile_cache.set(cache_key, user_profile, current_app.config["SPOTIFY_USER_PROFILE_CACHE_TTL_SECONDS"])
+    return user_profile
+
+
+def get_user_id(spotify: spotipy.Spotify, spotify_auth_dict: dict) -> str:
+    """
+    Get the current user's Spotify id
+    Use the user id stored with the session when available, otherwise the cached user profile
+    """
+    if spotify_auth_dict.get(SESSION_DB_USER_ID_KEY) is not None:
+        return spotify_auth_dict[SESSION_DB_USER_ID_KEY]
+    return get_user_profile(spotify, spotify_auth_dict.get(SESSION_DB_ACCESS_TOKEN_KEY))["id"]
 
 
 def update_task_progress(task, state, meta):
@@ -13,69 +64,150 @@ def update_task_progress(task, state, meta):
         task.update_state(state=state, meta=meta)
 
 
-def get_tracks_from_playlist(task, spotify: spotipy.Spotify, playlist_id: str) -> List[str]:
+def create_task_progress_reporter(task) -> TaskProgressReporter:
     """
-    Get tracks from playlist based on playlist_id
+    Create a reporter which rate limits progress updates of task, for progress sent from loops
+    """
+    return TaskProgressReporter(
+        lambda progress: update_task_progress(task, state='PROGRESS', meta={'progress': progress}),
+        current_app.config["TASK_PROGRESS_MIN_INTERVAL_SECONDS"],
+        current_app.config["TASK_PROGRESS_MIN_PERCENT_DELTA"])
+
+
+def get_playlist_page_limit(playlist_id: str) -> int:
+    """
+    Get the largest page size accepted for playlist_id
+    """
+    if playlist_id == LIKED_TRACKS_PLAYLIST_ID:
+        return LIKED_TRACKS_PAGE_LIMIT
+    return PLAYLIST_ITEMS_PAGE_LIMIT
+
+
+def get_playlist_page(spotify: spotipy.Spotify, playlist_id: str, offset: int, fields: str = None):
+    """
+    Get a single page of items from playlist based on playlist_id
+    Use separate spotify call for retrieving Liked Tracks (saved tracks endpoint does not support fields)
+    """
+    limit = get_playlist_page_limit(playlist_id)
+    if playlist_id == LIKED_TRACKS_PLAYLIST_ID:
+        return spotify.current_user_saved_tracks(limit=limit, offset=offset)
+    return spotify.playlist_items(playlist_id, fields=fields, limit=limit, offset=offset)
+
+
+def iterate_playlist_pages(spotify: spotipy.Spotify, playlist_id: str, max_workers: int = 1,
+                           fields: str = None) -> Iterator[dict]:
+    """
+    Yield pages of items from playlist based on playlist_id, in playlist order, as they are retrieved
+    First page is retrieved to read total, remaining offsets are retrieved with up to max_workers concurrent calls
+    At most max_workers pages are held in memory at once
+    """
+    first_page = get_playlist_page(spotify, playlist_id, 0, fields)
+    yield first_page
+    if first_page is None or "items" not in first_page or len(first_page["items"]) == 0:
+        return
+
+    total = first_page.get("total", len(first_page["items"]))
+    offsets = range(len(first_page["items"]), total, get_playlist_page_limit(playlist_id))
+
+    if max_workers is None or max_workers <= 1 or len(offsets) <= 1:
+        for offset in offsets:
+            yield get_playlist_page(spotify, playlist_id, offset, fields)
+        return
+
+    # Results are yielded in submission order so playlist order is kept
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(offsets))) as executor:
+        pending_pages = deque()
+        for offset in offsets:
+            pending_pages.append(executor.submit(get_playlist_page, spotify, playlist_id, offset, fields))
+            if len(pending_pages) >= max_workers:
+                yield pending_pages.popleft().result()
+        while pending_pages:
+            yield pending_pages.popleft().result()
+
+
+def iterate_playlist_items(task, spotify: spotipy.Spotify, playlist_id: str, max_workers: int = 1,
+                           fields: str = None) -> Iterator[dict]:
+    """
+    Yield playlist items from playlist based on playlist_id as each page is retrieved
     Use separate spotify call for retrieving Liked Tracks
     """
+    items_count = 0
+    progress_reporter = create_task_progress_reporter(task)
+    for tracks_response in iterate_playlist_pages(spotify, playlist_id, max_workers, fields):
+        if tracks_response is None or "items" not in tracks_response:
+            continue
+        for track in tracks_response["items"]:
+            yield track
+        items_count += len(tracks_response["items"])
+        progress_reporter.update("Retrieved " + str(items_count) + " tracks so far...",
+                                 items_count, tracks_response.get("total"))
+    progress_reporter.flush()
+
+
+def iterate_user_playlists(spotify: spotipy.Spotify) -> Iterator[dict]:
+    """
+    Yield every playlist of the current user, retrieving further pages as required
+    """
     offset = 0
-    all_tracks = []
     while True:
-        if playlist_id == LIKED_TRACKS_PLAYLIST_ID:
-            tracks_response = spotify.current_user_saved_tracks(limit=50, offset=offset)
-        else:
-            tracks_response = spotify.playlist_items(playlist_id, limit=50, offset=offset)
-        if tracks_response is not None and "items" in tracks_response:
-            if len(tracks_response["items"]) == 0:
-                break
-            for track in tracks_response["items"]:
-                if track["track"] is not None and track["track"]["uri"] is not None:
-                    all_tracks.append(track["track"]["uri"])
-                else:
-                    current_app.logger.info("Track missing uri: " + str(track))
-            offset += len(tracks_response["items"])
-        update_task_progress(task=task, state='PROGRESS', meta={'progress': {
-                             'state': "Retrieved " + str(len(all_tracks)) + " tracks so far..."}})
-    return all_tracks
+        playlists_response = spotify.current_user_playlists(limit=USER_PLAYLISTS_PAGE_LIMIT, offset=offset)
+        if playlists_response is None or "items" not in playlists_response or len(playlists_response["items"]) == 0:
+            return
+        for playlist in playlists_response["items"]:
+            yield playlist
+        offset += len(playlists_response["items"])
+        if playlists_response.get("next") is None or offset >= playlists_response.get("total", offset + 1):
+            return
 
 
-def get_all_tracks_with_data_from_playlist(task, spotify: spotipy.Spotify, playlist_id: str):
+def get_tracks_from_playlist(task, spotify: spotipy.Spotify, playlist_id: str, max_workers: int = 1) -> List[str]:
     """
-    Get tracks from playlist based on playlist_id
+    Get track uris from playlist based on playlist_id
+    Only track uris are requested for playlists to reduce response size
     Use separate spotify call for retrieving Liked Tracks
     """
-    offset = 0
     all_tracks = []
-    while True:
-        if playlist_id == LIKED_TRACKS_PLAYLIST_ID:
-            tracks_response = spotify.current_user_saved_tracks(limit=50, offset=offset)
+    for track in iterate_playlist_items(task, spotify, playlist_id, max_workers, PLAYLIST_TRACK_URI_FIELDS):
+        if track["track"] is not None and track["track"]["uri"] is not None:
+            all_tracks.append(track["track"]["uri"])
         else:
-            tracks_response = spotify.playlist_items(playlist_id, limit=50, offset=offset)
-        if "items" in tracks_response:
-            if len(tracks_response["items"]) == 0:
-                break
-            for track in tracks_response["items"]:
-                all_tracks.append(track)
-        offset += len(tracks_response["items"])
-        update_task_progress(task, state='PROGRESS', meta={'progress': {
-                             'state': "Retrieved " + str(len(all_tracks)) + " tracks so far..."}})
-        if offset >= tracks_response["total"]:
-            break
+            current_app.logger.info("Track missing uri: " + str(track))
     return all_tracks
 
 
-def get_liked_tracks_count(spotify: spotipy.Spotify):
+def get_all_tracks_with_data_from_playlist(task, spotify: spotipy.Spotify, playlist_id: str, max_workers: int = 1):
     """
-    Get number of songs in user library
-    If error, return False
+    Get tracks from playlist based on playlist_id
+    Use separate spotify call for retrieving Liked Tracks
+    Prefer iterate_playlist_items when the full list of tracks does not need to be kept
+    """
+    return list(iterate_playlist_items(task, spotify, playlist_id, max_workers))
+
+
+def probe_liked_tracks_count(spotify: spotipy.Spotify, etag: str = None) -> dict:
+    """
+    Get number of songs in user library with the smallest request possible
+    If etag from a previous probe is given, Spotify responds 304 with no body when the library hasn't changed
+    Return dict with count (None if unchanged or error), etag for the next probe and whether the library changed
     """
-    liked_tracks_response = spotify.current_user_saved_tracks()
-    # get_liked_tracks_log = "Liked tracks response: {response}"
-    # current_app.logger.debug(
-    #     get_liked_tracks_log.format(response=liked_tracks_response))
-    if "total" in liked_tracks_response:
-        return liked_tracks_response["total"]
-    return None
+    # Spotipy doesn't allow request headers to be set, so call the endpoint with the client's session and auth
+    headers = spotify._auth_headers()
+    if etag is not None:
+        headers["If-None-Match"] = etag
+    response = spotify._session.get(
+        spotify.prefix + LIKED_TRACKS_URL,
+        params={"limit": 1},
+        headers=headers,
+        timeout=spotify.requests_timeout)
+    if response.status_code == 304:
+        return {"count": None, "etag": etag, "changed": False}
+    response.raise_for_status()
+    liked_tracks_response = response.json()
+    return {
+        "count": liked_tracks_response.get("total"),
+        "etag": response.headers.get("ETag"),
+        "changed": True
+    }
 
 
 def get_all_track_audio_features(task, spotify: spotipy.Spotify, tracks: list):
@@ -84,25 +216,16 @@ def get_all_track_audio_features(task, spotify: spotipy.Spotify, tracks: list):
     If error, return False
     """
     update_task_progress(task, state='PROGRESS', meta={'progress': {'state': "Getting audio features for each track"}})
-    tracks_left = len(tracks)
-    index = 0
+    progress_reporter = create_task_progress_reporter(task)
     all_track_features = []
-    while tracks_left > 0:
-        # Max 100 tracks at once
-        if tracks_left < 100:
-            tracks_to_analyse = tracks[index: index + tracks_left]
-            tracks_left -= tracks_left
-            index += tracks_left
-        else:
-            tracks_to_analyse = tracks[index: index + 100]
-            tracks_left -= 100
-            index += 100
+    # Max 100 tracks at once
+    for index in range(0, len(tracks), 100):
+        tracks_to_analyse = tracks[index: index + 100]
         response = spotify.audio_features(tracks_to_analyse)
         all_track_features += response
-        update_task_progress(
-            task, state='PROGRESS', meta={
-                'progress': {
-                    'state': "Retrieved audio features for " + str(index) + " tracks so far..."}})
+        retrieved_count = index + len(tracks_to_analyse)
+        progress_reporter.update("Retrieved audio features for " + str(retrieved_count) + " tracks so far...",
+                                 retrieved_count, len(tracks))
     return all_track_features
 
 
@@ -124,7 +247,8 @@ def create_new_playlist_with_tracks(
         new_playlist_name: str,
         public_status: bool,
         playlist_description: str,
-        tracks_to_add: List[str]):
+        tracks_to_add: List[str],
+        user_id: str = None):
     try:
         if tracks_to_add is None:
             raise Exception("No tracks to add")
@@ -135,7 +259,8 @@ def create_new_playlist_with_tracks(
             raise Exception("No tracks to add")
 
         # Create new playlist
-        user_id = spotify.me()["id"]
+        if user_id is None:
+            user_id = spotify.me()["id"]
         new_playlist = spotify.user_playlist_create(
             user=user_id,
             name=new_playlist_name,
@@ -151,43 +276,31 @@ def create_new_playlist_with_tracks(
             )
         )
 
-        # Add 100 tracks per call
-        if len(tracks_to_add) <= 100:
-            calls_required = 1
-        else:
-            calls_required = len(tracks_to_add) // 100 + 1
-        left_over = len(tracks_to_add) % 100
-        for i in range(calls_required):
-            if i == calls_required - 1:
-                add_items_response = spotify.playlist_add_items(
-                    new_playlist_id, tracks_to_add[i * 100: i * 100 + left_over])
-                update_task_progress(task, state='PROGRESS', meta={'progress': {
-                                     'state': "Adding  " + str(i * 100 + left_over) + "/" + str(len(tracks_to_add))
-                                     + " tracks..."}})
-            else:
-                add_items_response = spotify.playlist_add_items(new_playlist_id, tracks_to_add[i * 100: i * 100 + 100])
-                update_task_progress(task, state='PROGRESS', meta={'progress': {
-                                     'state': "Added " + str(i * 100 + 100) + "/" + str(len(tracks_to_add))
-                                     + " tracks"}})
-            if "snapshot_id" not in add_items_response:
-                current_app.logger.error("Error while adding tracks. Response: " + add_items_response)
-                return {
-                    "error": "Unable to add tracks to playlist " + new_playlist_id
-                }
+        # Add tracks in order, 100 tracks per call
+        chunk_durations = add_tracks_to_playlist(task, spotify, new_playlist_id, tracks_to_add)
+        if chunk_durations is None:
+            return {
+                "error": "Unable to add tracks to playlist " + new_playlist_id
+            }
 
         create_playlist_with_tracks_success_log = (
             "User: {user_id}"
             + "-- Created playlist: {playlist_id}"
             + "-- Length: {length:d}"
+            + "-- Add tracks calls: {calls:d} in {total_seconds:.2f}s (slowest {slowest_seconds:.2f}s)"
         )
         current_app.logger.info(
             create_playlist_with_tracks_success_log.format(
                 user_id=user_id,
                 playlist_id=new_playlist_id,
-                length=len(tracks_to_add)))
+                length=len(tracks_to_add),
+                calls=len(chunk_durations),
+                total_seconds=sum(chunk_durations),
+                slowest_seconds=max(chunk_durations)))
 
         return {
             "status": "success",
+            "playlist_id": new_playlist_id,
             "playlist_uri": new_playlist["external_urls"]["spotify"],
             "num_of_tracks": len(tracks_to_add),
             "creation_time": datetime.now()
@@ -199,6 +312,98 @@ def create_new_playlist_with_tracks(
         }
 
 
+def replace_playlist_tracks(
+        task,
+        spotify: spotipy.Spotify,
+        playlist_id: str,
+        playlist_uri: str,
+        tracks_to_add: List[str]):
+    """
+    Replace all tracks in an existing playlist, keeping the playlist itself
+    First chunk replaces the playlist contents in one call, remaining tracks are appended
+    """
+    try:
+        if tracks_to_add is None:
+            raise Exception("No tracks to add")
+
+        # Remove any invalid uris which have a whitespace
+        tracks_to_add = validate_tracks(tracks_to_add)
+        if len(tracks_to_add) == 0:
+            raise Exception("No tracks to add")
+
+        replace_start_time = time.perf_counter()
+        replace_items_response = spotify.playlist_replace_items(playlist_id, tracks_to_add[:PLAYLIST_ADD_ITEMS_LIMIT])
+        replace_duration = time.perf_counter() - replace_start_time
+        if replace_items_response is None or "snapshot_id" not in replace_items_response:
+            current_app.logger.error("Error while replacing tracks. Response: " + str(replace_items_response))
+            return {
+                "error": "Unable to replace tracks in playlist " + playlist_id
+            }
+        update_task_progress(task, state='PROGRESS', meta={'progress': {
+                             'state': "Added " + str(min(len(tracks_to_add), PLAYLIST_ADD_ITEMS_LIMIT)) + "/"
+                             + str(len(tracks_to_add)) + " tracks"}})
+
+        chunk_durations = add_tracks_to_playlist(
+            task, spotify, playlist_id, tracks_to_add[PLAYLIST_ADD_ITEMS_LIMIT:], PLAYLIST_ADD_ITEMS_LIMIT)
+        if chunk_durations is None:
+            return {
+                "error": "Unable to add tracks to playlist " + playlist_id
+            }
+        chunk_durations.insert(0, replace_duration)
+
+        current_app.logger.info(
+            "Replaced tracks in playlist: {playlist_id} -- Length: {length:d} -- Calls: {calls:d} in {total_seconds:.2f}s"
+            .format(
+                playlist_id=playlist_id,
+                length=len(tracks_to_add),
+                calls=len(chunk_durations),
+                total_seconds=sum(chunk_durations)))
+
+        return {
+            "status": "success",
+            "playlist_id": playlist_id,
+            "playlist_uri": playlist_uri,
+            "num_of_tracks": len(tracks_to_add),
+            "creation_time": datetime.now()
+        }
+    except Exception as e:
+        current_app.logger.error("Error while replacing tracks in playlist: " + str(e))
+        return {
+            "error": "Unable to replace tracks in playlist"
+        }
+
+
+def add_tracks_to_playlist(task, spotify: spotipy.Spotify, playlist_id: str, tracks_to_add: List[str],
+                           already_added_count: int = 0):
+    """
+    Add tracks to playlist in order, PLAYLIST_ADD_ITEMS_LIMIT tracks per call
+    Tracks are expected to already be validated
+    already_added_count is the number of tracks already in the playlist, used for progress updates
+    Chunks are prepared up front and sent back to back over the client's keep-alive session
+    Return duration in seconds of each call, or None if tracks could not be added
+    """
+    chunks = [tracks_to_add[i: i + PLAYLIST_ADD_ITEMS_LIMIT]
+              for i in range(0, len(tracks_to_add), PLAYLIST_ADD_ITEMS_LIMIT)]
+    chunk_durations = []
+    added_count = already_added_count
+    total_count = already_added_count + len(tracks_to_add)
+    progress_reporter = create_task_progress_reporter(task)
+    for chunk in chunks:
+        chunk_start_time = time.perf_counter()
+        add_items_response = spotify.playlist_add_items(playlist_id, chunk)
+        chunk_durations.append(time.perf_counter() - chunk_start_time)
+        if add_items_response is None or "snapshot_id" not in add_items_response:
+            current_app.logger.error("Error while adding tracks. Response: " + str(add_items_response))
+            return None
+        added_count += len(chunk)
+        current_app.logger.debug(
+            "Playlist: {playlist_id} -- Added chunk of {chunk_size:d} tracks in {seconds:.3f}s".format(
+                playlist_id=playlist_id, chunk_size=len(chunk), seconds=chunk_durations[-1]))
+        progress_reporter.update("Added " + str(added_count) + "/" + str(total_count) + " tracks",
+                                 added_count, total_count)
+    return chunk_durations
+
+
 def validate_tracks(track_list: List[str]) -> List[str]:
     valid_tracks = []
     invalid_tracks = []